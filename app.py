@@ -2,15 +2,39 @@
 NOAA KLWX Radar Display Web Application
 Displays current weather radar imagery from NOAA for radar station KLWX
 """
-from flask import Flask, render_template, jsonify, send_file, request
+from flask import Flask, render_template, jsonify, send_file, request, url_for, g, Response
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import io
-from PIL import Image
+import numpy as np
 import logging
-import xml.etree.ElementTree as ET
+import json
+import hmac
+import math
+import os
+import uuid
 import re
+from urllib.parse import urlencode
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from itertools import islice
 from weather_layers import WEATHER_LAYERS, CURRENT_LAYER
+from stations import RADAR_STATIONS
+from palettes import PALETTES
+import georef
+import metrics
+import budget
+from budget import FOREGROUND, PREFETCH, UpstreamShed
+from frames import CapabilitiesIndex, Frame, FrameStore, parse_wms_time
+import storm_cells
+import nowcast
+import zonal
+import composite
+import snapshot
+import archive
+import export
 try:
     from zoneinfo import ZoneInfo
     TIMEZONE_SUPPORT = True
@@ -25,160 +49,28 @@ app.logger.setLevel(logging.INFO)
 # Global storage for radar timestamp history
 radar_history_storage = []
 
-# Radar station database with identifiers, names, coordinates, and states
-RADAR_STATIONS = {
-    'KABR': {'name': 'Aberdeen', 'lat': 45.4558, 'lon': -98.4132, 'state': 'South Dakota'},
-    'KABX': {'name': 'Albuquerque', 'lat': 35.1497, 'lon': -106.8244, 'state': 'New Mexico'},
-    'KAKQ': {'name': 'Norfolk/Wakefield', 'lat': 36.9840, 'lon': -77.0074, 'state': 'Virginia'},
-    'KAMA': {'name': 'Amarillo', 'lat': 35.2333, 'lon': -101.7092, 'state': 'Texas'},
-    'KAMX': {'name': 'Miami', 'lat': 25.6111, 'lon': -80.4128, 'state': 'Florida'},
-    'KAPX': {'name': 'Gaylord', 'lat': 44.9067, 'lon': -84.7197, 'state': 'Michigan'},
-    'KARX': {'name': 'La Crosse', 'lat': 43.8228, 'lon': -91.1914, 'state': 'Wisconsin'},
-    'KATX': {'name': 'Seattle/Tacoma', 'lat': 48.1947, 'lon': -122.4958, 'state': 'Washington'},
-    'KBBX': {'name': 'Beale AFB', 'lat': 39.4961, 'lon': -121.6317, 'state': 'California'},
-    'KBGM': {'name': 'Binghamton', 'lat': 42.1997, 'lon': -75.9847, 'state': 'New York'},
-    'KBHX': {'name': 'Eureka', 'lat': 40.4986, 'lon': -124.2919, 'state': 'California'},
-    'KBIS': {'name': 'Bismarck', 'lat': 46.7708, 'lon': -100.7603, 'state': 'North Dakota'},
-    'KBLX': {'name': 'Billings', 'lat': 45.8536, 'lon': -108.6061, 'state': 'Montana'},
-    'KBMX': {'name': 'Birmingham', 'lat': 33.1722, 'lon': -86.7697, 'state': 'Alabama'},
-    'KBOX': {'name': 'Boston', 'lat': 41.9556, 'lon': -71.1367, 'state': 'Massachusetts'},
-    'KBRO': {'name': 'Brownsville', 'lat': 25.9161, 'lon': -97.4189, 'state': 'Texas'},
-    'KBUF': {'name': 'Buffalo', 'lat': 42.9489, 'lon': -78.7369, 'state': 'New York'},
-    'KBYX': {'name': 'Key West', 'lat': 24.5975, 'lon': -81.7031, 'state': 'Florida'},
-    'KCAE': {'name': 'Columbia', 'lat': 33.9489, 'lon': -81.1186, 'state': 'South Carolina'},
-    'KCBW': {'name': 'Houlton', 'lat': 46.0392, 'lon': -67.8067, 'state': 'Maine'},
-    'KCBX': {'name': 'Boise', 'lat': 43.4906, 'lon': -116.2356, 'state': 'Idaho'},
-    'KCCX': {'name': 'State College', 'lat': 40.9231, 'lon': -78.0036, 'state': 'Pennsylvania'},
-    'KCLE': {'name': 'Cleveland', 'lat': 41.4133, 'lon': -81.8597, 'state': 'Ohio'},
-    'KCLX': {'name': 'Charleston', 'lat': 32.6556, 'lon': -81.0422, 'state': 'South Carolina'},
-    'KCRP': {'name': 'Corpus Christi', 'lat': 27.7842, 'lon': -97.5111, 'state': 'Texas'},
-    'KCXX': {'name': 'Burlington', 'lat': 44.5111, 'lon': -73.1667, 'state': 'Vermont'},
-    'KCYS': {'name': 'Cheyenne', 'lat': 41.1519, 'lon': -104.8061, 'state': 'Wyoming'},
-    'KDAX': {'name': 'Sacramento', 'lat': 38.5011, 'lon': -121.6778, 'state': 'California'},
-    'KDDC': {'name': 'Dodge City', 'lat': 37.7608, 'lon': -99.9689, 'state': 'Kansas'},
-    'KDFX': {'name': 'Laughlin AFB', 'lat': 29.2731, 'lon': -100.2803, 'state': 'Texas'},
-    'KDGX': {'name': 'Jackson', 'lat': 32.2803, 'lon': -89.9844, 'state': 'Mississippi'},
-    'KDIX': {'name': 'Philadelphia', 'lat': 39.9469, 'lon': -74.4111, 'state': 'New Jersey'},
-    'KDLH': {'name': 'Duluth', 'lat': 46.8369, 'lon': -92.2097, 'state': 'Minnesota'},
-    'KDMX': {'name': 'Des Moines', 'lat': 41.7311, 'lon': -93.7231, 'state': 'Iowa'},
-    'KDOX': {'name': 'Dover AFB', 'lat': 38.8256, 'lon': -75.4400, 'state': 'Delaware'},
-    'KDTX': {'name': 'Detroit', 'lat': 42.6997, 'lon': -83.4717, 'state': 'Michigan'},
-    'KDVN': {'name': 'Davenport', 'lat': 41.6117, 'lon': -90.5808, 'state': 'Iowa'},
-    'KEAX': {'name': 'Kansas City', 'lat': 38.8103, 'lon': -94.2644, 'state': 'Missouri'},
-    'KEMX': {'name': 'Tucson', 'lat': 31.8936, 'lon': -110.6300, 'state': 'Arizona'},
-    'KENX': {'name': 'Albany', 'lat': 42.5864, 'lon': -74.0639, 'state': 'New York'},
-    'KEOX': {'name': 'Fort Rucker', 'lat': 31.4606, 'lon': -85.4594, 'state': 'Alabama'},
-    'KEPZ': {'name': 'El Paso', 'lat': 31.8731, 'lon': -106.6978, 'state': 'Texas'},
-    'KESX': {'name': 'Las Vegas', 'lat': 35.7011, 'lon': -114.8919, 'state': 'Nevada'},
-    'KEVX': {'name': 'Eglin AFB', 'lat': 30.5644, 'lon': -85.9214, 'state': 'Florida'},
-    'KEWX': {'name': 'Austin/San Antonio', 'lat': 29.7039, 'lon': -98.0283, 'state': 'Texas'},
-    'KEYX': {'name': 'Edwards AFB', 'lat': 35.0978, 'lon': -117.5606, 'state': 'California'},
-    'KFCX': {'name': 'Roanoke', 'lat': 37.0242, 'lon': -80.2742, 'state': 'Virginia'},
-    'KFDR': {'name': 'Altus AFB', 'lat': 34.3622, 'lon': -98.9761, 'state': 'Oklahoma'},
-    'KFDX': {'name': 'Cannon AFB', 'lat': 34.6347, 'lon': -103.6186, 'state': 'New Mexico'},
-    'KFFC': {'name': 'Atlanta', 'lat': 33.3636, 'lon': -84.5658, 'state': 'Georgia'},
-    'KFSD': {'name': 'Sioux Falls', 'lat': 43.5878, 'lon': -96.7289, 'state': 'South Dakota'},
-    'KFSX': {'name': 'Flagstaff', 'lat': 34.5744, 'lon': -111.1983, 'state': 'Arizona'},
-    'KFTG': {'name': 'Denver', 'lat': 39.7867, 'lon': -104.5458, 'state': 'Colorado'},
-    'KFWS': {'name': 'Dallas/Fort Worth', 'lat': 32.5731, 'lon': -97.3031, 'state': 'Texas'},
-    'KGGW': {'name': 'Glasgow', 'lat': 48.2064, 'lon': -106.6250, 'state': 'Montana'},
-    'KGJX': {'name': 'Grand Junction', 'lat': 39.0619, 'lon': -108.2139, 'state': 'Colorado'},
-    'KGLD': {'name': 'Goodland', 'lat': 39.3667, 'lon': -101.7000, 'state': 'Kansas'},
-    'KGRB': {'name': 'Green Bay', 'lat': 44.4986, 'lon': -88.1117, 'state': 'Wisconsin'},
-    'KGRK': {'name': 'Fort Hood', 'lat': 30.7217, 'lon': -97.3831, 'state': 'Texas'},
-    'KGRR': {'name': 'Grand Rapids', 'lat': 42.8939, 'lon': -85.5447, 'state': 'Michigan'},
-    'KGSP': {'name': 'Greer', 'lat': 34.8833, 'lon': -82.2200, 'state': 'South Carolina'},
-    'KGWX': {'name': 'Columbus AFB', 'lat': 33.8967, 'lon': -88.3292, 'state': 'Mississippi'},
-    'KGYX': {'name': 'Portland', 'lat': 43.8914, 'lon': -70.2564, 'state': 'Maine'},
-    'KHDX': {'name': 'Holloman AFB', 'lat': 33.0786, 'lon': -106.1222, 'state': 'New Mexico'},
-    'KHGX': {'name': 'Houston/Galveston', 'lat': 29.4719, 'lon': -95.0792, 'state': 'Texas'},
-    'KHNX': {'name': 'San Joaquin Valley', 'lat': 36.3142, 'lon': -119.6322, 'state': 'California'},
-    'KHPX': {'name': 'Fort Campbell', 'lat': 36.7367, 'lon': -87.2856, 'state': 'Kentucky'},
-    'KHTX': {'name': 'Huntsville', 'lat': 34.9306, 'lon': -86.0836, 'state': 'Alabama'},
-    'KICT': {'name': 'Wichita', 'lat': 37.6544, 'lon': -97.4431, 'state': 'Kansas'},
-    'KILX': {'name': 'Lincoln', 'lat': 40.1506, 'lon': -89.3367, 'state': 'Illinois'},
-    'KIND': {'name': 'Indianapolis', 'lat': 39.7075, 'lon': -86.2803, 'state': 'Indiana'},
-    'KINX': {'name': 'Tulsa', 'lat': 36.1750, 'lon': -95.5644, 'state': 'Oklahoma'},
-    'KIWA': {'name': 'Phoenix', 'lat': 33.2892, 'lon': -111.6700, 'state': 'Arizona'},
-    'KIWX': {'name': 'North Webster', 'lat': 41.3586, 'lon': -85.7000, 'state': 'Indiana'},
-    'KJAX': {'name': 'Jacksonville', 'lat': 30.4847, 'lon': -81.7019, 'state': 'Florida'},
-    'KJGX': {'name': 'Robins AFB', 'lat': 32.6750, 'lon': -83.3511, 'state': 'Georgia'},
-    'KJKL': {'name': 'Jackson', 'lat': 37.5906, 'lon': -83.3131, 'state': 'Kentucky'},
-    'KLBB': {'name': 'Lubbock', 'lat': 33.6539, 'lon': -101.8142, 'state': 'Texas'},
-    'KLCH': {'name': 'Lake Charles', 'lat': 30.1253, 'lon': -93.2158, 'state': 'Louisiana'},
-    'KLIX': {'name': 'New Orleans', 'lat': 30.3367, 'lon': -89.8256, 'state': 'Louisiana'},
-    'KLNX': {'name': 'North Platte', 'lat': 41.9581, 'lon': -100.5758, 'state': 'Nebraska'},
-    'KLOT': {'name': 'Chicago', 'lat': 41.6044, 'lon': -88.0844, 'state': 'Illinois'},
-    'KLRX': {'name': 'Elko', 'lat': 40.7397, 'lon': -116.8028, 'state': 'Nevada'},
-    'KLSX': {'name': 'St. Louis', 'lat': 38.6989, 'lon': -90.6828, 'state': 'Missouri'},
-    'KLTX': {'name': 'Wilmington', 'lat': 33.9892, 'lon': -78.4292, 'state': 'North Carolina'},
-    'KLVX': {'name': 'Louisville', 'lat': 37.9753, 'lon': -85.9436, 'state': 'Kentucky'},
-    'KLWX': {'name': 'Sterling', 'lat': 38.9754, 'lon': -77.4778, 'state': 'Virginia'},
-    'KLZK': {'name': 'Little Rock', 'lat': 34.8364, 'lon': -92.2622, 'state': 'Arkansas'},
-    'KMAF': {'name': 'Midland/Odessa', 'lat': 31.9433, 'lon': -102.1892, 'state': 'Texas'},
-    'KMAX': {'name': 'Medford', 'lat': 42.0811, 'lon': -122.7175, 'state': 'Oregon'},
-    'KMBX': {'name': 'Minot AFB', 'lat': 48.3925, 'lon': -100.8644, 'state': 'North Dakota'},
-    'KMHX': {'name': 'Morehead City', 'lat': 34.7756, 'lon': -76.8761, 'state': 'North Carolina'},
-    'KMKX': {'name': 'Milwaukee', 'lat': 42.9678, 'lon': -88.5506, 'state': 'Wisconsin'},
-    'KMLB': {'name': 'Melbourne', 'lat': 28.1133, 'lon': -80.6542, 'state': 'Florida'},
-    'KMOB': {'name': 'Mobile', 'lat': 30.6794, 'lon': -88.2397, 'state': 'Alabama'},
-    'KMPX': {'name': 'Minneapolis/St. Paul', 'lat': 44.8489, 'lon': -93.5653, 'state': 'Minnesota'},
-    'KMQT': {'name': 'Marquette', 'lat': 46.5311, 'lon': -87.5486, 'state': 'Michigan'},
-    'KMRX': {'name': 'Knoxville/Tri-Cities', 'lat': 36.1686, 'lon': -83.4017, 'state': 'Tennessee'},
-    'KMSX': {'name': 'Missoula', 'lat': 47.0414, 'lon': -113.9864, 'state': 'Montana'},
-    'KMTX': {'name': 'Salt Lake City', 'lat': 41.2628, 'lon': -112.4453, 'state': 'Utah'},
-    'KMUX': {'name': 'San Francisco', 'lat': 37.1553, 'lon': -121.8981, 'state': 'California'},
-    'KMVX': {'name': 'Grand Forks', 'lat': 47.5281, 'lon': -97.3256, 'state': 'North Dakota'},
-    'KMXX': {'name': 'Maxwell AFB', 'lat': 32.5367, 'lon': -85.7897, 'state': 'Alabama'},
-    'KNKX': {'name': 'San Diego', 'lat': 32.9189, 'lon': -117.0419, 'state': 'California'},
-    'KNQA': {'name': 'Millington', 'lat': 35.3447, 'lon': -89.8736, 'state': 'Tennessee'},
-    'KOAX': {'name': 'Omaha', 'lat': 41.3203, 'lon': -96.3667, 'state': 'Nebraska'},
-    'KOHX': {'name': 'Nashville', 'lat': 36.2472, 'lon': -86.5625, 'state': 'Tennessee'},
-    'KOKX': {'name': 'New York City', 'lat': 40.8656, 'lon': -72.8644, 'state': 'New York'},
-    'KOTX': {'name': 'Spokane', 'lat': 47.6803, 'lon': -117.6267, 'state': 'Washington'},
-    'KPAH': {'name': 'Paducah', 'lat': 37.0683, 'lon': -88.7719, 'state': 'Kentucky'},
-    'KPBZ': {'name': 'Pittsburgh', 'lat': 40.5317, 'lon': -80.2178, 'state': 'Pennsylvania'},
-    'KPDT': {'name': 'Pendleton', 'lat': 45.6906, 'lon': -118.8528, 'state': 'Oregon'},
-    'KPOE': {'name': 'Fort Polk', 'lat': 31.1556, 'lon': -92.9761, 'state': 'Louisiana'},
-    'KPUX': {'name': 'Pueblo', 'lat': 38.4594, 'lon': -104.1814, 'state': 'Colorado'},
-    'KRAX': {'name': 'Raleigh/Durham', 'lat': 35.6656, 'lon': -78.4897, 'state': 'North Carolina'},
-    'KRGX': {'name': 'Reno', 'lat': 39.7542, 'lon': -119.4622, 'state': 'Nevada'},
-    'KRIW': {'name': 'Riverton', 'lat': 43.0661, 'lon': -108.4769, 'state': 'Wyoming'},
-    'KRLX': {'name': 'Charleston', 'lat': 38.3111, 'lon': -81.7231, 'state': 'West Virginia'},
-    'KRMX': {'name': 'Griffiss AFB', 'lat': 43.4678, 'lon': -75.4581, 'state': 'New York'},
-    'KRTX': {'name': 'Portland', 'lat': 45.7150, 'lon': -122.9653, 'state': 'Oregon'},
-    'KSFX': {'name': 'Pocatello/Idaho Falls', 'lat': 43.1058, 'lon': -112.6856, 'state': 'Idaho'},
-    'KSGF': {'name': 'Springfield', 'lat': 37.2353, 'lon': -93.4006, 'state': 'Missouri'},
-    'KSHV': {'name': 'Shreveport', 'lat': 32.4506, 'lon': -93.8414, 'state': 'Louisiana'},
-    'KSJT': {'name': 'San Angelo', 'lat': 31.3711, 'lon': -100.4925, 'state': 'Texas'},
-    'KSOX': {'name': 'Santa Ana Mountains', 'lat': 33.8175, 'lon': -117.6361, 'state': 'California'},
-    'KSRX': {'name': 'Western Arkansas', 'lat': 35.2906, 'lon': -94.3619, 'state': 'Arkansas'},
-    'KTBW': {'name': 'Tampa Bay', 'lat': 27.7056, 'lon': -82.4017, 'state': 'Florida'},
-    'KTFX': {'name': 'Great Falls', 'lat': 47.4597, 'lon': -111.3853, 'state': 'Montana'},
-    'KTLH': {'name': 'Tallahassee', 'lat': 30.3975, 'lon': -84.3289, 'state': 'Florida'},
-    'KTLX': {'name': 'Oklahoma City', 'lat': 35.3331, 'lon': -97.2778, 'state': 'Oklahoma'},
-    'KTWX': {'name': 'Topeka', 'lat': 38.9969, 'lon': -96.2322, 'state': 'Kansas'},
-    'KTYX': {'name': 'Montpelier', 'lat': 43.7556, 'lon': -75.6800, 'state': 'New York'},
-    'KUDX': {'name': 'Rapid City', 'lat': 44.1250, 'lon': -102.8297, 'state': 'South Dakota'},
-    'KUEX': {'name': 'Hastings', 'lat': 40.3208, 'lon': -98.4417, 'state': 'Nebraska'},
-    'KVAX': {'name': 'Moody AFB', 'lat': 30.8903, 'lon': -83.0019, 'state': 'Georgia'},
-    'KVBX': {'name': 'Vandenberg AFB', 'lat': 34.8381, 'lon': -120.3978, 'state': 'California'},
-    'KVNX': {'name': 'Vance AFB', 'lat': 36.7406, 'lon': -98.1281, 'state': 'Oklahoma'},
-    'KVTX': {'name': 'Los Angeles', 'lat': 34.4119, 'lon': -119.1797, 'state': 'California'},
-    'KVWX': {'name': 'Evansville', 'lat': 38.2600, 'lon': -87.7244, 'state': 'Indiana'},
-    'KYUX': {'name': 'Yuma', 'lat': 32.4953, 'lon': -114.6567, 'state': 'Arizona'}
-}
-
 # Current radar station configuration
 RADAR_STATION = "KCLE"  # Cleveland, Ohio radar station
 
 # Current weather layer selection
 current_weather_layer = CURRENT_LAYER
 
+# NOAA GeoServer root (workspaces live below it)
+NOAA_GEOSERVER = os.environ.get("NOAA_GEOSERVER", "https://opengeo.ncep.noaa.gov/geoserver").rstrip("/")
+
+# Number of recent scans kept per layer (the capabilities list ~20)
+FRAME_HISTORY_LENGTH = 20
+
+# GetMap image sizes (width, height)
+STANDARD_SIZE = (1400, 1200)
+HIGH_RES_SIZE = (2048, 1728)  # Ultra-high resolution for super-res and hybrid layers
+
 # Get current radar coordinates from database
-def get_radar_coords():
-    station = RADAR_STATIONS.get(RADAR_STATION, RADAR_STATIONS['KCLE'])
-    return station['lat'], station['lon']
+def get_radar_coords(station_id=None):
+    if station_id is None:
+        station_id = RADAR_STATION
+    station = RADAR_STATIONS.get(station_id) or RADAR_STATIONS['KCLE']
+    return station.lat, station.lon
 
 RADAR_LAT, RADAR_LON = get_radar_coords()
 
@@ -194,36 +86,50 @@ def build_bbox(center_lat=None, center_lon=None, lat_span=5.0, lon_span=6.0):
     lon_max = center_lon + lon_span / 2.0
     return lon_min, lat_min, lon_max, lat_max
 
-def build_wms_url(layer_id=None):
+def request_grid(layer_config=None, station=None, lat_span=5.0, lon_span=6.0):
+    """Pixel grid (bbox and image size) that GetMap requests for a layer cover"""
+    lat, lon = get_radar_coords(station)
+    # Use ultra-high resolution for high-res layers, standard high-res for others
+    width, height = HIGH_RES_SIZE if layer_config and layer_config.get('high_res', False) else STANDARD_SIZE
+    return georef.grid(build_bbox(lat, lon, lat_span, lon_span), width, height)
+
+def resolve_layer_name(layer_config, station=None):
+    """Substitute the station into dynamic layer names"""
+    if station is None:
+        station = RADAR_STATION
+    layer_name = layer_config['layer']
+    if layer_config.get('dynamic_station', False):
+        layer_name = layer_name.replace('{station}', station)
+        layer_name = layer_name.replace('{station_lower}', station.lower())
+    return layer_name
+
+def layer_workspace(layer_config, station=None):
+    """GeoServer workspace that publishes a layer"""
+    if station is None:
+        station = RADAR_STATION
+    if layer_config['service'] == 'mrms':
+        return 'mrms'
+    elif layer_config['service'] == 'station-specific':
+        return station.lower()
+    return 'conus'
+
+def build_wms_url(layer_id=None, station=None, time=None):
     if layer_id is None:
         layer_id = current_weather_layer
+    if station is None:
+        station = RADAR_STATION
     
     layer_config = WEATHER_LAYERS.get(layer_id, WEATHER_LAYERS['reflectivity'])
     
-    lon_min, lat_min, lon_max, lat_max = build_bbox()
-    bbox = f"{lon_min},{lat_min},{lon_max},{lat_max}"
+    grid = request_grid(layer_config, station)
     
     # Select base URL based on service
-    if layer_config['service'] == 'mrms':
-        base = "https://opengeo.ncep.noaa.gov/geoserver/mrms/ows"
-    elif layer_config['service'] == 'station-specific':
-        base = f"https://opengeo.ncep.noaa.gov/geoserver/{RADAR_STATION.lower()}/ows"
-    else:  # conus
-        base = "https://opengeo.ncep.noaa.gov/geoserver/conus/ows"
+    base = f"{NOAA_GEOSERVER}/{layer_workspace(layer_config, station)}/ows"
     
     # Handle dynamic station replacement for local radar layers
-    layer_name = layer_config['layer']
-    if layer_config.get('dynamic_station', False):
-        layer_name = layer_name.replace('{station}', RADAR_STATION)
-        layer_name = layer_name.replace('{station_lower}', RADAR_STATION.lower())
-    
-    # Use ultra-high resolution for high-res layers, standard high-res for others
-    if layer_config.get('high_res', False):
-        width, height = "2048", "1728"  # Ultra-high resolution for super-res and hybrid layers
-    else:
-        width, height = "1400", "1200"  # Standard high resolution
+    layer_name = resolve_layer_name(layer_config, station)
     
-    # Simplified parameters - remove TIME and format_options that might cause issues
+    # Simplified parameters - TIME is only sent when a specific scan is wanted
     params = {
         "service": "WMS",
         "request": "GetMap",
@@ -231,44 +137,29 @@ def build_wms_url(layer_id=None):
         "layers": layer_name,
         "format": "image/png",
         "transparent": "true",
-        "width": width,
-        "height": height,
-        "srs": "EPSG:4326",
-        "bbox": bbox,
+        **grid.wms_params("1.1.1"),
         "bgcolor": "0x00000000"
     }
-    from urllib.parse import urlencode
+    if time:
+        params["time"] = time
     return f"{base}?{urlencode(params)}"
 
-def build_wms_url_130(layer_id=None):
+def build_wms_url_130(layer_id=None, station=None, time=None):
     """WMS 1.3.0 variant (lat,lon axis order for EPSG:4326)."""
     if layer_id is None:
         layer_id = current_weather_layer
+    if station is None:
+        station = RADAR_STATION
     
     layer_config = WEATHER_LAYERS.get(layer_id, WEATHER_LAYERS['reflectivity'])
     
-    lon_min, lat_min, lon_max, lat_max = build_bbox()
-    bbox = f"{lat_min},{lon_min},{lat_max},{lon_max}"
+    grid = request_grid(layer_config, station)
     
     # Select base URL based on service
-    if layer_config['service'] == 'mrms':
-        base = "https://opengeo.ncep.noaa.gov/geoserver/mrms/ows"
-    elif layer_config['service'] == 'station-specific':
-        base = f"https://opengeo.ncep.noaa.gov/geoserver/{RADAR_STATION.lower()}/ows"
-    else:  # conus
-        base = "https://opengeo.ncep.noaa.gov/geoserver/conus/ows"
+    base = f"{NOAA_GEOSERVER}/{layer_workspace(layer_config, station)}/ows"
     
     # Handle dynamic station replacement for local radar layers
-    layer_name = layer_config['layer']
-    if layer_config.get('dynamic_station', False):
-        layer_name = layer_name.replace('{station}', RADAR_STATION)
-        layer_name = layer_name.replace('{station_lower}', RADAR_STATION.lower())
-    
-    # Use ultra-high resolution for high-res layers, standard high-res for others
-    if layer_config.get('high_res', False):
-        width, height = "2048", "1728"  # Ultra-high resolution for super-res and hybrid layers
-    else:
-        width, height = "1400", "1200"  # Standard high resolution
+    layer_name = resolve_layer_name(layer_config, station)
     
     # Simplified parameters
     params = {
@@ -278,19 +169,16 @@ def build_wms_url_130(layer_id=None):
         "layers": layer_name,
         "format": "image/png",
         "transparent": "true",
-        "width": width,
-        "height": height,
-        "crs": "EPSG:4326",
-        "bbox": bbox,
+        **grid.wms_params("1.3.0"),
         "bgcolor": "0x00000000"
     }
-    from urllib.parse import urlencode
+    if time:
+        params["time"] = time
     return f"{base}?{urlencode(params)}"
 
-def build_conus_bref_url():
+def build_conus_bref_url(station=None, time=None):
     """Fallback to CONUS base reflectivity layer with wider bbox."""
-    lon_min, lat_min, lon_max, lat_max = build_bbox(lat_span=6.0, lon_span=8.0)
-    bbox = f"{lon_min},{lat_min},{lon_max},{lat_max}"
+    grid = request_grid(station=station, lat_span=6.0, lon_span=8.0)
     params = {
         "service": "WMS",
         "request": "GetMap",
@@ -298,25 +186,57 @@ def build_conus_bref_url():
         "layers": "conus:conus_bref_qcd",
         "format": "image/png",
         "transparent": "true",
-        "width": "1400",
-        "height": "1200",
-        "srs": "EPSG:4326",
-        "bbox": bbox,
+        **grid.wms_params("1.1.1"),
         "bgcolor": "0x00000000",
     }
-    base = "https://opengeo.ncep.noaa.gov/geoserver/conus/ows"
-    from urllib.parse import urlencode
+    if time:
+        params["time"] = time
+    base = f"{NOAA_GEOSERVER}/conus/ows"
     return f"{base}?{urlencode(params)}"
 
+def build_composite_url(layer_ids, station=None, time=None):
+    """Single GetMap drawing several layers of one workspace, the first at the bottom"""
+    if station is None:
+        station = RADAR_STATION
+    configs = [WEATHER_LAYERS[layer_id] for layer_id in layer_ids]
+    # Request the finest size any of the layers is normally fetched at
+    grid = request_grid(max(configs, key=lambda c: c.get('high_res', False)), station)
+    params = {
+        "service": "WMS",
+        "request": "GetMap",
+        "version": "1.1.1",
+        "layers": ",".join(resolve_layer_name(c, station) for c in configs),
+        "format": "image/png",
+        "transparent": "true",
+        **grid.wms_params("1.1.1"),
+        "bgcolor": "0x00000000"
+    }
+    if time:
+        params["time"] = time
+    return f"{NOAA_GEOSERVER}/{layer_workspace(configs[0], station)}/ows?{urlencode(params)}"
+
+def build_capabilities_url(workspace):
+    """GetCapabilities URL for a GeoServer workspace"""
+    params = {"service": "WMS", "request": "GetCapabilities", "version": "1.3.0"}
+    return f"{NOAA_GEOSERVER}/{workspace}/ows?{urlencode(params)}"
+
 def _is_png(content: bytes) -> bool:
     return bool(content) and len(content) >= 8 and content[:8] == b"\x89PNG\r\n\x1a\n"
 
-def _try_fetch(url: str, session: requests.Session) -> bytes | None:
+def _try_fetch(url: str, session: requests.Session, candidate: str = 'unknown',
+               priority: str = FOREGROUND) -> bytes | None:
+    if not upstream_budget.acquire(url, priority):
+        raise UpstreamShed(f"{candidate} shed ({priority})")
+    start = time.perf_counter()
+    outcome = 'error'
     try:
         resp = session.get(url, headers=_http_headers(), timeout=20)
+        metrics.UPSTREAM_BYTES.inc(len(resp.content), candidate=candidate)
         app.logger.info(f"GET {url[:120]}... -> {resp.status_code} {resp.headers.get('Content-Type')}")
         if resp.status_code == 200 and _is_png(resp.content):
+            outcome = 'ok'
             return resp.content
+        outcome = f"http_{resp.status_code}" if resp.status_code != 200 else 'not_png'
         # Log XML error snippets if present
         ctype = resp.headers.get('Content-Type', '')
         if 'xml' in ctype:
@@ -325,8 +245,14 @@ def _try_fetch(url: str, session: requests.Session) -> bytes | None:
     except Exception as e:
         app.logger.error(f"Fetch failed: {e}")
         return None
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.UPSTREAM_SECONDS.observe(elapsed, candidate=candidate, outcome=outcome)
+        metrics.record_span('upstream', elapsed, candidate=candidate, outcome=outcome)
 
-def fetch_radar_image_bytes(layer_id=None) -> tuple[bytes | None, str | None]:
+def fetch_radar_candidates(layer_id=None, station=None, time=None,
+                           priority=FOREGROUND) -> tuple[bytes | None, str | None, str | None]:
+    """Walk the fallback chain; returns (content, url, candidate name), raises UpstreamShed when shed"""
     session = requests.Session()
     
     # Check if this is a station-specific layer like velocity
@@ -335,29 +261,191 @@ def fetch_radar_image_bytes(layer_id=None) -> tuple[bytes | None, str | None]:
         if layer_config.get('service') == 'station-specific':
             # For station-specific layers, only try the proper station-specific URLs
             candidates = [
-                ("station_wms_111", build_wms_url(layer_id)),
-                ("station_wms_130", build_wms_url_130(layer_id)),
+                ("station_wms_111", build_wms_url(layer_id, station, time)),
+                ("station_wms_130", build_wms_url_130(layer_id, station, time)),
             ]
         else:
             # For regular layers, use the full fallback chain
             candidates = [
-                ("mrms_wms_111", build_wms_url(layer_id)),
-                ("mrms_wms_130", build_wms_url_130(layer_id)),
-                ("conus_bref", build_conus_bref_url()),
+                ("mrms_wms_111", build_wms_url(layer_id, station, time)),
+                ("mrms_wms_130", build_wms_url_130(layer_id, station, time)),
+                ("conus_bref", build_conus_bref_url(station, time)),
             ]
     else:
         # Default fallback chain for unknown layers
         candidates = [
-            ("mrms_wms_111", build_wms_url(layer_id)),
-            ("mrms_wms_130", build_wms_url_130(layer_id)),
-            ("conus_bref", build_conus_bref_url()),
+            ("mrms_wms_111", build_wms_url(layer_id, station, time)),
+            ("mrms_wms_130", build_wms_url_130(layer_id, station, time)),
+            ("conus_bref", build_conus_bref_url(station, time)),
         ]
     
     for name, url in candidates:
-        content = _try_fetch(url, session)
+        content = _try_fetch(url, session, name, priority)
         if content:
-            return content, url
-    return None, None
+            return content, url, name
+    return None, None, None
+
+# Last good untimed image per (station, layer), served while upstream calls are shed
+_latest_images = OrderedDict()
+_latest_images_lock = threading.Lock()
+LATEST_IMAGE_CACHE_SIZE = 32
+STALE_IMAGE_MAX_AGE = 900  # seconds
+
+def fetch_latest_image(layer_id=None, station=None, priority=FOREGROUND) -> tuple[bytes | None, str | None, bool]:
+    """
+    Latest image through the fallback chain; returns (content, url, stale).
+
+    When the upstream budget sheds the request, the last good image (or
+    the newest cached history frame) is returned with stale=True instead;
+    UpstreamShed is raised only when there is nothing cached to serve.
+    """
+    if layer_id is None:
+        layer_id = current_weather_layer
+    if station is None:
+        station = RADAR_STATION
+    key = (station, layer_id)
+    try:
+        content, url, source = fetch_radar_candidates(layer_id, station, priority=priority)
+    except UpstreamShed:
+        with _latest_images_lock:
+            entry = _latest_images.get(key)
+        if entry and time.monotonic() - entry[2] < STALE_IMAGE_MAX_AGE:
+            return entry[0], entry[1], True
+        cached = frame_store.frames(station, layer_id)
+        if cached:
+            return cached[-1].content, cached[-1].url, True
+        raise
+    if content:
+        with _latest_images_lock:
+            _latest_images[key] = (content, url, time.monotonic())
+            _latest_images.move_to_end(key)
+            while len(_latest_images) > LATEST_IMAGE_CACHE_SIZE:
+                _latest_images.popitem(last=False)
+        if frame_archive is not None:
+            archive_latest_image(station, layer_id, content, url, source)
+    return content, url, False
+
+def archive_latest_image(station, layer_id, content, url, source):
+    """
+    Record an untimed latest image (what the viewer shows) in the archive.
+
+    It is keyed by the newest scan time the layer advertises, so repeated
+    polls of one scan are archived once; layers without a time dimension,
+    and the CONUS fallback (a different layer), are keyed by fetch time.
+    """
+    try:
+        times = get_layer_times(layer_id, station) if source != 'conus_bref' else []
+        frame_archive.record(Frame(station, layer_id, times[-1] if times else None, content, url, source))
+    except Exception as e:
+        # Archiving never fails the request
+        app.logger.warning(f"Could not archive latest {station}/{layer_id}: {e}")
+
+def fetch_radar_image_bytes(layer_id=None, priority=FOREGROUND) -> tuple[bytes | None, str | None]:
+    content, url, _ = fetch_latest_image(layer_id, priority=priority)
+    return content, url
+
+def fetch_capabilities(workspace, priority=FOREGROUND) -> bytes | None:
+    """Download the GetCapabilities document for a workspace; raises UpstreamShed when shed"""
+    url = build_capabilities_url(workspace)
+    if not upstream_budget.acquire(url, priority):
+        raise UpstreamShed(f"capabilities {workspace} shed ({priority})")
+    try:
+        resp = requests.get(url, headers=_http_headers(), timeout=20)
+        app.logger.info(f"GET {url[:120]}... -> {resp.status_code}")
+        if resp.status_code == 200 and b'Capabilities' in resp.content[:2048]:
+            return resp.content
+    except Exception as e:
+        app.logger.error(f"Capabilities fetch failed: {e}")
+    return None
+
+# Upstream request budget per NOAA host for the whole deployment.  Each
+# process gets an equal share of it (gunicorn.conf.py sets WEB_CONCURRENCY);
+# a share's burst never drops below budget.MIN_BURST
+UPSTREAM_RATE = float(os.environ.get('UPSTREAM_RATE', 20))
+UPSTREAM_BURST = float(os.environ.get('UPSTREAM_BURST', 40))
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+upstream_budget = budget.UpstreamBudget(UPSTREAM_RATE / WEB_CONCURRENCY, UPSTREAM_BURST / WEB_CONCURRENCY)
+
+# Opt-in archive of every scan loaded, for replaying past events (unset or '' disables it)
+ARCHIVE_DIR = os.environ.get('RADAR_ARCHIVE_DIR', '')
+ARCHIVE_MAX_AGE_HOURS = float(os.environ.get('RADAR_ARCHIVE_MAX_AGE_HOURS', 48))
+ARCHIVE_MAX_MB = float(os.environ.get('RADAR_ARCHIVE_MAX_MB', 2048))
+frame_archive = (archive.FrameArchive(ARCHIVE_DIR, ARCHIVE_MAX_AGE_HOURS, int(ARCHIVE_MAX_MB * 1024 * 1024), app.logger)
+                 if ARCHIVE_DIR else None)
+
+# Capabilities time index and recent frame history shared by all requests
+capabilities_index = CapabilitiesIndex(fetch_capabilities)
+frame_store = FrameStore(fetch_radar_candidates, on_load=frame_archive.record if frame_archive else None)
+
+# Opt-in warm-start snapshots of the frame store and capabilities index (unset or '' disables them)
+SNAPSHOT_DIR = os.environ.get('RADAR_SNAPSHOT_DIR', '')
+SNAPSHOT_INTERVAL = float(os.environ.get('RADAR_SNAPSHOT_INTERVAL', 60))
+
+snapshot_writer = None
+if SNAPSHOT_DIR:
+    try:
+        restored, restored_decoded = snapshot.restore_snapshot(SNAPSHOT_DIR, frame_store, capabilities_index,
+                                                                   NOAA_GEOSERVER)
+        if restored:
+            app.logger.info(f"Restored {restored} frames ({restored_decoded} decoded) from {SNAPSHOT_DIR}")
+    except Exception as e:
+        # A damaged snapshot only costs the warm start
+        app.logger.warning(f"Could not restore snapshot from {SNAPSHOT_DIR}: {e}")
+    snapshot_writer = snapshot.SnapshotWriter(SNAPSHOT_DIR, frame_store, capabilities_index, NOAA_GEOSERVER,
+                                              SNAPSHOT_INTERVAL, app.logger)
+
+# Request handler capacity per process (gunicorn --threads), for the saturation gauge
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 1))
+
+metrics.Gauge('radar_http_worker_saturation', 'In-flight requests per request handler thread',
+              function=lambda: metrics.HTTP_IN_FLIGHT.value() / WORKER_THREADS)
+metrics.Gauge('radar_fetch_worker_saturation', 'Busy frame fetch workers per pool worker',
+              function=lambda: metrics.FETCH_WORKERS_BUSY.value() / frame_store.workers)
+metrics.Gauge('radar_upstream_budget_utilization', 'Share of the upstream token bucket in use',
+              labels=('host',), function=upstream_budget.utilization)
+metrics.Gauge('radar_upstream_budget_rate', 'Upstream requests per second allowed per host, for this process',
+              function=lambda: upstream_budget.rate)
+metrics.Gauge('radar_frame_store_frames', 'Frames held by the frame store',
+              function=lambda: frame_store.sizes()[0])
+metrics.Gauge('radar_frame_store_decoded', 'Frames holding decoded levels',
+              function=lambda: frame_store.sizes()[1])
+
+def get_layer_times(layer_id, station=None):
+    """Scan times advertised for a layer at a station, oldest first"""
+    if station is None:
+        station = RADAR_STATION
+    layer_config = WEATHER_LAYERS.get(layer_id, WEATHER_LAYERS['reflectivity'])
+    return capabilities_index.times(layer_workspace(layer_config, station),
+                                    resolve_layer_name(layer_config, station))
+
+def load_frame_history(layer_id, station=None, limit=FRAME_HISTORY_LENGTH):
+    """Fetch (or reuse) the most recent frames of a layer, oldest first"""
+    if station is None:
+        station = RADAR_STATION
+    times = get_layer_times(layer_id, station)[-limit:]
+    if not times:
+        # No time dimension available: fall back to the untimed latest image
+        frame = frame_store.load(station, layer_id, None)
+        return [frame] if frame else []
+    # The newest scan is what the viewer sees first; older ones are backfill
+    return frame_store.load_many(station, layer_id, times, latest_priority=FOREGROUND)
+
+def _shed_response():
+    """503 for requests whose upstream calls were shed with nothing cached to serve"""
+    response = jsonify({'error': 'Upstream request budget exhausted, try again shortly'})
+    response.headers['Retry-After'] = '2'
+    return response, 503
+
+def _encoded_json_response(encoded, max_age=3600):
+    """Serve a pre-encoded (body, etag) JSON payload, or 304 when the client has it"""
+    body, etag = encoded
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}' if max_age else 'no-cache'
+    return response
 
 def _http_headers():
     return {
@@ -431,6 +519,10 @@ def get_radar_data_timestamp():
         ]
         
         for name, url in candidates:
+            # Probes only refine the displayed time, so they give way to image fetches
+            if not upstream_budget.acquire(url, PREFETCH):
+                app.logger.info(f"Timestamp check for {name} shed by the upstream budget")
+                return None
             try:
                 resp = session.get(url, headers=_http_headers(), timeout=15)
                 app.logger.info(f"Timestamp check for {name}: {resp.status_code}")
@@ -486,14 +578,56 @@ def get_radar_data_timestamp():
         app.logger.error(f"Error getting radar timestamp: {e}")
         return None
 
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    g.spans = metrics.start_request_spans()
+    metrics.HTTP_IN_FLIGHT.inc()
+    if snapshot_writer is not None:
+        snapshot_writer.ensure_started()
+    if frame_archive is not None:
+        frame_archive.ensure_started()
+
+@app.after_request
+def record_request_timing(response):
+    """Record latency and response size, and log the request's spans as one JSON line"""
+    start = g.get('request_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    # Route templates keep the label set bounded
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.HTTP_SECONDS.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    size = response.content_length
+    if size:
+        metrics.HTTP_RESPONSE_BYTES.inc(size, route=route)
+    response.headers['X-Request-ID'] = g.request_id
+    if route != '/metrics':
+        app.logger.info("request " + json.dumps({
+            'id': g.request_id,
+            'method': request.method,
+            'route': route,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000.0, 2),
+            'bytes': size,
+            'spans': g.spans
+        }, default=str))
+    return response
+
+@app.teardown_request
+def finish_request_timing(_error=None):
+    if g.pop('request_start', None) is not None:
+        metrics.HTTP_IN_FLIGHT.dec()
+
 @app.route('/')
 def index():
     """Home page displaying the radar map"""
-    station_info = RADAR_STATIONS.get(RADAR_STATION, RADAR_STATIONS['KCLE'])
+    station_info = RADAR_STATIONS.get(RADAR_STATION) or RADAR_STATIONS['KCLE']
     return render_template('index.html', 
                          station=RADAR_STATION,
-                         station_name=station_info['name'],
-                         station_state=station_info['state'])
+                         station_name=station_info.name,
+                         station_state=station_info.state)
 
 @app.route('/api/radar')
 def get_radar_image():
@@ -509,7 +643,10 @@ def get_radar_image():
             layer_id = current_weather_layer
         
         # Fetch with fallbacks using specified layer
-        content, used_url = fetch_radar_image_bytes(layer_id)
+        try:
+            content, used_url, stale = fetch_latest_image(layer_id)
+        except UpstreamShed:
+            return _shed_response()
         if not content:
             raise RuntimeError("Failed to fetch radar image from all sources")
         app.logger.info(f"Serving radar image from: {used_url}")
@@ -521,11 +658,15 @@ def get_radar_image():
         except Exception as fe:
             app.logger.debug(f"Could not save debug image: {fe}")
         
-        return send_file(
+        response = send_file(
             io.BytesIO(content),
             mimetype='image/png',
             as_attachment=False
         )
+        if stale:
+            metrics.STALE_RESPONSES.inc(route='/api/radar')
+            response.headers['X-Radar-Stale'] = 'true'
+        return response
     except Exception as e:
         app.logger.error(f"Error fetching radar: {e}")
         return jsonify({'error': str(e)}), 500
@@ -535,8 +676,11 @@ def radar_status():
     """Check radar data availability"""
     try:
         # Use same fetcher to determine availability
-        content, used_url = fetch_radar_image_bytes(current_weather_layer)
-        status = 'online' if content else 'offline'
+        try:
+            content, used_url = fetch_radar_image_bytes(current_weather_layer, priority=PREFETCH)
+            status = 'online' if content else 'offline'
+        except UpstreamShed:
+            status = 'throttled'
         
         # Try to get actual radar data timestamp
         data_timestamp = get_radar_data_timestamp()
@@ -645,8 +789,10 @@ def radar_timestamp_history():
 def radar_debug():
     """Return the current WMS URL and bbox used for debugging."""
     lon_min, lat_min, lon_max, lat_max = build_bbox()
+    layer_config = WEATHER_LAYERS.get(current_weather_layer, WEATHER_LAYERS['reflectivity'])
     return jsonify({
         'station': RADAR_STATION,
+        'grid': request_grid(layer_config).describe(),
         'bbox': {
             'lon_min': lon_min,
             'lat_min': lat_min,
@@ -661,19 +807,27 @@ def radar_debug():
 
 @app.route('/api/radar/stations')
 def get_radar_stations():
-    """Get list of all available radar stations"""
-    stations = []
-    for station_id, station_info in RADAR_STATIONS.items():
-        stations.append({
-            'id': station_id,
-            'name': station_info['name'],
-            'state': station_info['state'],
-            'lat': station_info['lat'],
-            'lon': station_info['lon']
-        })
-    # Sort by state, then by identifier
-    stations.sort(key=lambda x: (x['state'], x['id']))
-    return jsonify(stations)
+    """Get list of all available radar stations (sorted by state, then identifier)"""
+    state = request.args.get('state')
+    if state is None:
+        return _encoded_json_response(RADAR_STATIONS.list_json)
+    encoded = RADAR_STATIONS.state_json(state)
+    if encoded is None:
+        return jsonify({'error': f'No radar stations in {state}'}), 404
+    return _encoded_json_response(encoded)
+
+@app.route('/api/radar/stations/by-state')
+def get_radar_stations_by_state():
+    """Radar stations grouped by state"""
+    return _encoded_json_response(RADAR_STATIONS.by_state_json)
+
+@app.route('/api/radar/stations/<station_id>')
+def get_radar_station_info(station_id):
+    """Information for one radar station"""
+    encoded = RADAR_STATIONS.info_json(station_id.upper())
+    if encoded is None:
+        return jsonify({'error': 'Invalid radar station'}), 404
+    return _encoded_json_response(encoded)
 
 @app.route('/api/radar/station', methods=['POST'])
 def set_radar_station():
@@ -698,23 +852,18 @@ def set_radar_station():
     return jsonify({
         'success': True,
         'station_id': station_id,
-        'name': station_info['name'],
-        'state': station_info['state'],
-        'lat': station_info['lat'],
-        'lon': station_info['lon']
+        'name': station_info.name,
+        'state': station_info.state,
+        'lat': station_info.lat,
+        'lon': station_info.lon
     })
 
 @app.route('/api/radar/current-station')
 def get_current_station():
     """Get current radar station information"""
-    station_info = RADAR_STATIONS.get(RADAR_STATION, RADAR_STATIONS['KCLE'])
-    return jsonify({
-        'station_id': RADAR_STATION,
-        'name': station_info['name'],
-        'state': station_info['state'],
-        'lat': station_info['lat'],
-        'lon': station_info['lon']
-    })
+    # The current station changes with POST /api/radar/station, so clients revalidate
+    encoded = RADAR_STATIONS.current_json(RADAR_STATION) or RADAR_STATIONS.current_json('KCLE')
+    return _encoded_json_response(encoded, max_age=0)
 
 @app.route('/api/weather/layers')
 def get_weather_layers():
@@ -775,9 +924,129 @@ def get_current_layer():
 @app.route('/api/radar/url')
 def radar_url():
     """Return the working URL used (if any)."""
-    content, used_url = fetch_radar_image_bytes(current_weather_layer)
+    try:
+        content, used_url = fetch_radar_image_bytes(current_weather_layer)
+    except UpstreamShed:
+        return _shed_response()
     return jsonify({'ok': bool(content), 'url': used_url})
 
+# Hover lookups: values memoized per (frame, pixel), decoded images kept for the newest frames
+_value_cache = OrderedDict()
+_value_rgba = OrderedDict()
+_value_inflight = {}
+_value_lock = threading.Lock()
+VALUE_CACHE_SIZE = 4096
+VALUE_RGBA_FRAMES = 2
+VALUE_LATEST_MAX_AGE = 120  # seconds an untimed image answers lookups before it is refetched
+VALUE_CLIENT_MAX_AGE = 30  # Cache-Control hint for value responses
+
+def _value_singleflight(key, compute):
+    """Run compute() once for all concurrent callers with the same key"""
+    with _value_lock:
+        future = _value_inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _value_inflight[key] = Future()
+    if not owner:
+        return future.result(timeout=30)
+    try:
+        result = compute()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _value_lock:
+            _value_inflight.pop(key, None)
+
+def value_frame(layer_id, station=None):
+    """
+    The image hover lookups read: (key, grid, PNG source) where the source is a Frame or PNG bytes.
+
+    The newest advertised scan comes from the frame store; untimed layers
+    reuse the last good image for VALUE_LATEST_MAX_AGE seconds.  Raises
+    UpstreamShed when there is nothing cached to answer from.
+    """
+    if station is None:
+        station = RADAR_STATION
+    times = get_layer_times(layer_id, station)
+    if times:
+        try:
+            frame = frame_store.load(station, layer_id, times[-1])
+        except UpstreamShed:
+            cached = frame_store.frames(station, layer_id)
+            if not cached:
+                raise
+            frame = cached[-1]
+        if frame is not None:
+            return frame.key, frame.grid, frame
+    key = (station, layer_id)
+    with _latest_images_lock:
+        entry = _latest_images.get(key)
+    if entry is None or time.monotonic() - entry[2] > VALUE_LATEST_MAX_AGE:
+        content, url, _ = fetch_latest_image(layer_id, station)
+        if not content:
+            return None, None, None
+        with _latest_images_lock:
+            entry = _latest_images.get(key)
+        if entry is None or entry[0] is not content:
+            # Stale image served from the frame store
+            entry = (content, url, url)
+    return (station, layer_id, entry[2]), georef.grid_from_url(entry[1]), entry[0]
+
+def _value_image(key, source):
+    """Decoded RGBA of a value frame, shared by the lookups on it"""
+    with _value_lock:
+        rgba = _value_rgba.get(key)
+        if rgba is not None:
+            _value_rgba.move_to_end(key)
+            return rgba
+    
+    def decode():
+        if isinstance(source, bytes):
+            from PIL import Image
+            with metrics.span('png_decode'), Image.open(io.BytesIO(source)) as image:
+                decoded = np.asarray(image.convert('RGBA'))
+        else:
+            decoded = source.rgba
+        with _value_lock:
+            _value_rgba[key] = decoded
+            while len(_value_rgba) > VALUE_RGBA_FRAMES:
+                _value_rgba.popitem(last=False)
+        return decoded
+    return _value_singleflight(('rgba', key), decode)
+
+def lookup_value(key, source, layer_id, x, y):
+    """{'value', 'color'} at pixel (x, y) of a value frame, or None outside the image"""
+    cache_key = (key, layer_id, x, y)
+    with _value_lock:
+        result = _value_cache.get(cache_key)
+        if result is not None:
+            _value_cache.move_to_end(cache_key)
+    metrics.cache_result('values', result is not None)
+    if result is not None:
+        return result
+    
+    def compute():
+        rgba = _value_image(key, source)
+        if y >= rgba.shape[0] or x >= rgba.shape[1]:
+            return None
+        r, g, b, a = (int(v) for v in rgba[y, x])
+        if a == 0:
+            # Transparent pixels carry no data
+            value = 'No Data'
+        else:
+            # Convert color to radar value (this is approximate)
+            value = estimate_radar_value_from_color(r, g, b, layer_id)
+        computed = {'value': value, 'color': [r, g, b, a]}
+        with _value_lock:
+            _value_cache[cache_key] = computed
+            while len(_value_cache) > VALUE_CACHE_SIZE:
+                _value_cache.popitem(last=False)
+        return computed
+    return _value_singleflight(cache_key, compute)
+
 @app.route('/api/radar/value')
 def get_radar_value():
     """Get radar value at specific lat/lon coordinates"""
@@ -786,72 +1055,33 @@ def get_radar_value():
         lon = float(request.args.get('lon', 0))
         layer_id = request.args.get('layer', current_weather_layer)
         
-        # Get the current radar image
-        content, used_url = fetch_radar_image_bytes(layer_id)
-        if not content:
+        try:
+            key, grid, source = value_frame(layer_id)
+        except UpstreamShed:
+            return _shed_response()
+        if source is None:
             return jsonify({'error': 'No radar data available'}), 404
         
-        # Convert lat/lon to pixel coordinates within the radar image bounds
-        bbox = build_bbox()
-        lon_min, lat_min, lon_max, lat_max = bbox
-        
-        # Check if coordinates are within bounds
-        if not (lon_min <= lon <= lon_max and lat_min <= lat <= lat_max):
+        # Snap to the pixel grid of the request that actually answered
+        # (the CONUS fallback covers a wider bbox); nearby points share a result
+        pixel = grid.pixel(lat, lon)
+        if pixel is None:
             return jsonify({'error': 'Coordinates outside radar coverage'}), 400
+        x, y = pixel
         
-        # Determine image dimensions based on layer type
-        layer_config = WEATHER_LAYERS.get(layer_id, WEATHER_LAYERS['reflectivity'])
-        if layer_config.get('high_res', False):
-            img_width, img_height = 2048, 1728  # Ultra-high resolution
-        else:
-            img_width, img_height = 1400, 1200  # Standard high resolution
-        
-        # Convert to pixel coordinates
-        x = int((lon - lon_min) / (lon_max - lon_min) * img_width)
-        y = int((lat_max - lat) / (lat_max - lat_min) * img_height)  # Flip Y coordinate
-        
-        # Load image and get pixel value
         try:
-            from io import BytesIO
-            image = Image.open(BytesIO(content))
-            
-            # Ensure coordinates are within image bounds
-            if x < 0 or x >= image.width or y < 0 or y >= image.height:
-                return jsonify({'error': 'Coordinates outside image bounds'}), 400
-            
-            pixel = image.getpixel((x, y))
-            
-            # Handle different pixel formats
-            if isinstance(pixel, (tuple, list)):
-                if len(pixel) == 4:  # RGBA
-                    r, g, b, a = pixel
-                elif len(pixel) == 3:  # RGB
-                    r, g, b = pixel
-                    a = 255
-                else:
-                    return jsonify({'error': 'Unsupported pixel format'}), 500
-            elif isinstance(pixel, (int, float)):
-                # Grayscale - convert to RGB
-                r = g = b = int(pixel)
-                a = 255
-            else:
-                return jsonify({'error': 'Unknown pixel format'}), 500
-            
-            # Check for transparent/no-data pixels
-            if a == 0:
-                return jsonify({'value': 'No Data', 'color': [r, g, b, a]})
-            
-            # Convert color to radar value (this is approximate)
-            radar_value = estimate_radar_value_from_color(r, g, b, layer_id)
-            
-            return jsonify({
-                'value': radar_value,
-                'color': [int(r), int(g), int(b), int(a)],
-                'coordinates': {'lat': lat, 'lon': lon, 'x': x, 'y': y}
-            })
-            
+            result = lookup_value(key, source, layer_id, x, y)
         except Exception as e:
             return jsonify({'error': f'Image processing error: {str(e)}'}), 500
+        if result is None:
+            return jsonify({'error': 'Coordinates outside image bounds'}), 400
+        
+        if result['value'] == 'No Data':
+            response = jsonify(result)
+        else:
+            response = jsonify(dict(result, coordinates={'lat': lat, 'lon': lon, 'x': x, 'y': y}))
+        response.headers['Cache-Control'] = f'private, max-age={VALUE_CLIENT_MAX_AGE}'
+        return response
             
     except ValueError:
         return jsonify({'error': 'Invalid coordinates'}), 400
@@ -893,6 +1123,699 @@ def estimate_radar_value_from_color(r, g, b, layer_id):
         else:
             return f"Precipitation detected"
 
+# Cell detections per frame, so each scan is segmented only once
+_cell_cache = OrderedDict()
+_cell_cache_lock = threading.Lock()
+CELL_CACHE_SIZE = 256
+
+# Frames used for cell tracking by default
+CELL_TRACK_FRAMES = 6
+
+def detect_frame_cells(frame):
+    """Cached storm_cells.detect_cells for a frame; returns (cells, elapsed ms)"""
+    with _cell_cache_lock:
+        cells = _cell_cache.get(frame.key)
+    metrics.cache_result('cells', cells is not None)
+    if cells is not None:
+        return cells, 0.0
+    start = time.perf_counter()
+    cells = storm_cells.detect_cells(frame.values, frame.grid)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    metrics.record_span('cell_detect', elapsed_ms / 1000.0)
+    with _cell_cache_lock:
+        _cell_cache[frame.key] = cells
+        while len(_cell_cache) > CELL_CACHE_SIZE:
+            _cell_cache.popitem(last=False)
+    if elapsed_ms > storm_cells.FRAME_BUDGET_MS:
+        app.logger.warning(f"Cell detection for {frame.key} took {elapsed_ms:.0f} ms "
+                           f"(budget {storm_cells.FRAME_BUDGET_MS:.0f} ms)")
+    return cells, elapsed_ms
+
+@app.route('/api/radar/cells')
+def radar_cells():
+    """Detect storm cells on recent frames and track their motion"""
+    try:
+        station = request.args.get('station', RADAR_STATION).upper()
+        if station not in RADAR_STATIONS:
+            return jsonify({'error': 'Invalid radar station'}), 400
+        
+        layer_id = request.args.get('layer')
+        if layer_id is None:
+            # Fall back to base reflectivity when the current layer is not reflectivity
+            layer_id = current_weather_layer
+            if WEATHER_LAYERS[layer_id].get('palette') != 'reflectivity':
+                layer_id = 'reflectivity'
+        if WEATHER_LAYERS.get(layer_id, {}).get('palette') != 'reflectivity':
+            return jsonify({'error': 'Cell tracking needs a reflectivity layer'}), 400
+        
+        count = request.args.get('frames', CELL_TRACK_FRAMES, type=int)
+        count = max(1, min(count, FRAME_HISTORY_LENGTH))
+        
+        try:
+            frames = load_frame_history(layer_id, station, limit=count)
+        except UpstreamShed:
+            return _shed_response()
+        if not frames:
+            return jsonify({'error': 'No radar data available'}), 404
+        
+        history = []
+        frame_info = []
+        for frame in frames:
+            cells, elapsed_ms = detect_frame_cells(frame)
+            history.append((frame.scan_time, cells))
+            frame_info.append({
+                'time': frame.scan_time.isoformat(),
+                'cells': len(cells['lat']),
+                'detect_ms': round(elapsed_ms, 1)
+            })
+        
+        return jsonify({
+            'station': station,
+            'layer': layer_id,
+            'scan_time': frames[-1].scan_time.isoformat(),
+            'threshold_dbz': storm_cells.CELL_THRESHOLD_DBZ,
+            'budget_ms': storm_cells.FRAME_BUDGET_MS,
+            'frames': frame_info,
+            'cells': storm_cells.track_cells(history)
+        })
+    except Exception as e:
+        app.logger.error(f"Error tracking storm cells: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Nowcast frames per base frame, computed once and shared by all clients
+_nowcast_cache = OrderedDict()
+_nowcast_inflight = {}
+_nowcast_lock = threading.Lock()
+NOWCAST_CACHE_SIZE = 32
+
+def frame_intensity(frame):
+    """Echo intensity used for motion estimation (0 = no echo)"""
+    if frame.palette == 'reflectivity':
+        return np.maximum(np.nan_to_num(frame.values, nan=0.0), 0.0)
+    # Other products: track where there is any echo at all
+    return (frame.rgba[..., 3] > 0).astype(np.float32)
+
+def get_nowcast(layer_id, station=None):
+    """Extrapolated frames from the latest scan; computed at most once per scan"""
+    if station is None:
+        station = RADAR_STATION
+    frames = load_frame_history(layer_id, station, limit=nowcast.MOTION_FRAMES)
+    if not frames:
+        return None
+    latest = frames[-1]
+    key = latest.key
+    
+    with _nowcast_lock:
+        entry = _nowcast_cache.get(key)
+        metrics.cache_result('nowcast', entry is not None)
+        if entry is not None:
+            _nowcast_cache.move_to_end(key)
+            return entry
+        done = _nowcast_inflight.get(key)
+        owner = done is None
+        if owner:
+            done = _nowcast_inflight[key] = threading.Event()
+    if not owner:
+        # Another request is already computing this scan
+        done.wait(timeout=30)
+        with _nowcast_lock:
+            return _nowcast_cache.get(key)
+    
+    try:
+        # Motion can only be estimated between frames on the same grid
+        grid = latest.grid.key
+        history = [(f.scan_time, frame_intensity(f)) for f in frames
+                   if f.grid.key == grid]
+        start = time.perf_counter()
+        pngs, _ = nowcast.nowcast_frames(history, latest.rgba)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        metrics.record_span('nowcast', elapsed_ms / 1000.0)
+        if pngs is None:
+            return None
+        if elapsed_ms > nowcast.NOWCAST_BUDGET_MS:
+            app.logger.warning(f"Nowcast for {key} took {elapsed_ms:.0f} ms "
+                               f"(budget {nowcast.NOWCAST_BUDGET_MS:.0f} ms)")
+        
+        entry = {
+            'base': latest,
+            'frames': pngs,
+            'elapsed_ms': round(elapsed_ms, 1)
+        }
+        with _nowcast_lock:
+            _nowcast_cache[key] = entry
+            while len(_nowcast_cache) > NOWCAST_CACHE_SIZE:
+                _nowcast_cache.popitem(last=False)
+        return entry
+    finally:
+        with _nowcast_lock:
+            _nowcast_inflight.pop(key, None)
+        done.set()
+
+def _frame_request_args():
+    """Parse station/layer query arguments shared by the frame endpoints"""
+    station = request.args.get('station', RADAR_STATION).upper()
+    if station not in RADAR_STATIONS:
+        raise ValueError('Invalid radar station')
+    layer_id = request.args.get('layer', current_weather_layer)
+    if layer_id not in WEATHER_LAYERS:
+        raise ValueError('Invalid weather layer')
+    return station, layer_id
+
+@app.route('/api/radar/frames')
+def radar_frames():
+    """List the frame history of a layer, followed by nowcast frames"""
+    try:
+        station, layer_id = _frame_request_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    times = get_layer_times(layer_id, station)[-FRAME_HISTORY_LENGTH:]
+    frames = [{
+        'time': parse_wms_time(t).isoformat(),
+        'url': url_for('radar_frame', station=station, layer=layer_id, time=t),
+        'nowcast': False
+    } for t in times]
+    
+    if times and request.args.get('nowcast', 'true').lower() != 'false':
+        base = parse_wms_time(times[-1])
+        for lead in nowcast.NOWCAST_LEADS:
+            frames.append({
+                'time': (base + timedelta(minutes=lead)).isoformat(),
+                'url': url_for('radar_frame', station=station, layer=layer_id, time=times[-1], lead=lead),
+                'nowcast': True,
+                'lead_minutes': lead
+            })
+    
+    return jsonify({
+        'station': station,
+        'layer': layer_id,
+        'frames': frames,
+        'count': len(frames)
+    })
+
+@app.route('/api/radar/frame')
+def radar_frame():
+    """Serve one frame of the history, or a nowcast frame with ?lead=minutes"""
+    try:
+        station, layer_id = _frame_request_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        times = get_layer_times(layer_id, station)
+        scan = request.args.get('time') or (times[-1] if times else None)
+        if scan is not None and scan not in times:
+            return jsonify({'error': 'Unknown scan time'}), 404
+        
+        stale = False
+        lead = request.args.get('lead', type=int)
+        if lead is not None:
+            if lead not in nowcast.NOWCAST_LEADS:
+                return jsonify({'error': f'Lead must be one of {list(nowcast.NOWCAST_LEADS)}'}), 400
+            entry = get_nowcast(layer_id, station)
+            if entry is None:
+                return jsonify({'error': 'Not enough frames for a nowcast'}), 404
+            if scan is not None and entry['base'].time != scan:
+                return jsonify({'error': 'Nowcasts are only available from the latest scan'}), 404
+            content = entry['frames'][lead]
+            frame_time = entry['base'].scan_time + timedelta(minutes=lead)
+        else:
+            latest = scan is None or scan == times[-1]
+            try:
+                # Older scans are requested ahead of the animation reaching them
+                frame = frame_store.load(station, layer_id, scan, FOREGROUND if latest else PREFETCH)
+            except UpstreamShed:
+                cached = frame_store.frames(station, layer_id) if latest else []
+                if not cached:
+                    return _shed_response()
+                # Stand in the newest scan we have; X-Radar-Time says which one
+                frame, stale = cached[-1], True
+                metrics.STALE_RESPONSES.inc(route='/api/radar/frame')
+            if frame is None:
+                return jsonify({'error': 'No radar data available'}), 404
+            content = frame.content
+            frame_time = frame.scan_time
+        
+        response = send_file(io.BytesIO(content), mimetype='image/png', as_attachment=False)
+        response.headers['X-Radar-Time'] = frame_time.isoformat()
+        response.headers['X-Radar-Nowcast'] = 'true' if lead is not None else 'false'
+        if stale:
+            response.headers['X-Radar-Stale'] = 'true'
+        return response
+    except UpstreamShed:
+        return _shed_response()
+    except Exception as e:
+        app.logger.error(f"Error serving radar frame: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Composites per (station, layers, scan times)
+_composite_cache = OrderedDict()
+_composite_lock = threading.Lock()
+COMPOSITE_CACHE_SIZE = 32
+COMPOSITE_UNTIMED_MAX_AGE = 120  # seconds, for layers without a time dimension
+
+def build_composite(station, layer_ids, times):
+    """
+    Composite PNG of layers at the given scan times; returns (png, method) or (None, None).
+
+    Layers of one workspace at one scan time are drawn by GeoServer in a
+    single multi-layer GetMap.  Otherwise (or if that fails) the frames are
+    loaded in parallel through the frame store and composited here.
+    """
+    configs = [WEATHER_LAYERS[layer_id] for layer_id in layer_ids]
+    if len({layer_workspace(c, station) for c in configs}) == 1 and len(set(times)) == 1:
+        url = build_composite_url(layer_ids, station, times[0])
+        content = _try_fetch(url, requests.Session(), 'composite_wms')
+        if content:
+            return content, 'wms'
+    frames = frame_store.load_layers(station, list(zip(layer_ids, times)))
+    if any(frame is None for frame in frames):
+        return None, None
+    rgba, _ = composite.composite_frames(frames)
+    return nowcast.encode_png(rgba), 'server'
+
+@app.route('/api/radar/composite')
+def radar_composite():
+    """Several layers stacked into one PNG (?layers=a,b, first at the bottom) at their latest scans"""
+    station = request.args.get('station', RADAR_STATION).upper()
+    if station not in RADAR_STATIONS:
+        return jsonify({'error': 'Invalid radar station'}), 400
+    layer_ids = [l.strip() for l in request.args.get('layers', '').split(',') if l.strip()]
+    if not 2 <= len(layer_ids) <= composite.MAX_COMPOSITE_LAYERS or len(set(layer_ids)) != len(layer_ids):
+        return jsonify({'error': f'layers must name 2 to {composite.MAX_COMPOSITE_LAYERS} distinct layers'}), 400
+    unknown = [l for l in layer_ids if l not in WEATHER_LAYERS]
+    if unknown:
+        return jsonify({'error': f'Invalid weather layer: {", ".join(unknown)}'}), 400
+    
+    try:
+        # Latest advertised scan of each layer (None when a layer is untimed)
+        times = tuple((get_layer_times(l, station)[-1:] or [None])[0] for l in layer_ids)
+        key = (station, tuple(layer_ids), times)
+        with _composite_lock:
+            entry = _composite_cache.get(key)
+            if entry is not None and None in times and time.monotonic() - entry[2] > COMPOSITE_UNTIMED_MAX_AGE:
+                entry = None
+            if entry is not None:
+                _composite_cache.move_to_end(key)
+        metrics.cache_result('composite', entry is not None)
+        if entry is None:
+            content, method = build_composite(station, layer_ids, times)
+            if content is None:
+                return jsonify({'error': 'No radar data available'}), 404
+            entry = (content, method, time.monotonic())
+            with _composite_lock:
+                _composite_cache[key] = entry
+                while len(_composite_cache) > COMPOSITE_CACHE_SIZE:
+                    _composite_cache.popitem(last=False)
+        
+        scans = [parse_wms_time(t) for t in times if t]
+        response = send_file(io.BytesIO(entry[0]), mimetype='image/png', as_attachment=False)
+        response.headers['X-Radar-Time'] = max(scans).isoformat() if scans else datetime.now(timezone.utc).isoformat()
+        response.headers['X-Radar-Layers'] = ','.join(layer_ids)
+        response.headers['X-Radar-Composite'] = entry[1]
+        return response
+    except UpstreamShed:
+        return _shed_response()
+    except Exception as e:
+        app.logger.error(f"Error building composite: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Default look-back for time series queries
+TIMESERIES_DEFAULT_MINUTES = 120
+
+def parse_since(value, now=None):
+    """Parse a since= argument: minutes back from now, or an ISO8601 time"""
+    if now is None:
+        now = datetime.now(timezone.utc)
+    if value is None or value == '':
+        return now - timedelta(minutes=TIMESERIES_DEFAULT_MINUTES)
+    try:
+        minutes = float(value)
+    except ValueError:
+        minutes = None
+    if minutes is not None:
+        if not math.isfinite(minutes):
+            raise ValueError(f'Invalid time {value!r}: minutes must be finite')
+        try:
+            return now - timedelta(minutes=minutes)
+        except OverflowError:
+            raise ValueError(f'Invalid time {value!r}: out of range') from None
+    since = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return since
+
+@app.route('/api/radar/timeseries')
+def radar_timeseries():
+    """Value at a point across every frame of a layer since a given time"""
+    try:
+        station, layer_id = _frame_request_args()
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        since = parse_since(request.args.get('since'))
+    except KeyError:
+        return jsonify({'error': 'lat and lon are required'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e) or 'Invalid arguments'}), 400
+    
+    palette = WEATHER_LAYERS[layer_id].get('palette')
+    if not palette:
+        return jsonify({'error': 'Layer has no value scale'}), 400
+    
+    try:
+        times = [t for t in get_layer_times(layer_id, station) if parse_wms_time(t) >= since]
+        # Cached frames return immediately; missing ones are backfilled in parallel
+        frames = frame_store.load_many(station, layer_id, times)
+        # Clear pixels of accumulation products are a real 0.0, as in zonal stats
+        clear_value = PALETTES[palette].get('clear_value')
+        
+        points = []
+        for frame in frames:
+            pixel = frame.grid.pixel(lat, lon)
+            value = None
+            if pixel is not None:
+                x, y = pixel
+                found = float(frame.values_at(x, y))
+                if not np.isnan(found):
+                    value = found
+                elif clear_value is not None:
+                    value = float(clear_value)
+            points.append({
+                'time': frame.scan_time.isoformat(),
+                'value': value,
+                'pixel': list(pixel) if pixel else None
+            })
+        
+        return jsonify({
+            'station': station,
+            'layer': layer_id,
+            'lat': lat,
+            'lon': lon,
+            'units': PALETTES[palette]['units'],
+            'since': since.isoformat(),
+            'points': points,
+            'count': len(points),
+            'missing': len(times) - len(frames)
+        })
+    except Exception as e:
+        app.logger.error(f"Error building radar time series: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Rasterized polygon sets, reused across frames on the same grid
+zonal_masks = zonal.MaskCache()
+
+def _none_if_nan(values, digits):
+    return [None if v != v else round(v, digits) for v in values.tolist()]
+
+@app.route('/api/radar/zonal', methods=['POST'])
+def radar_zonal():
+    """Per-polygon min/mean/max and area over threshold for a GeoJSON body"""
+    try:
+        station, layer_id = _frame_request_args()
+        threshold = request.args.get('threshold', type=float)
+        geojson = request.get_json(silent=True)
+        if not isinstance(geojson, dict):
+            raise ValueError('A GeoJSON body is required')
+        polygons = zonal.parse_polygons(geojson)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    palette = WEATHER_LAYERS[layer_id].get('palette')
+    if not palette:
+        return jsonify({'error': 'Layer has no value scale'}), 400
+    
+    try:
+        times = get_layer_times(layer_id, station)
+        scan = request.args.get('time') or (times[-1] if times else None)
+        if scan is not None and scan not in times:
+            return jsonify({'error': 'Unknown scan time'}), 404
+        frame = frame_store.load(station, layer_id, scan)
+        if frame is None:
+            return jsonify({'error': 'No radar data available'}), 404
+        
+        scale = PALETTES[frame.palette]
+        if threshold is None:
+            threshold = scale['threshold']
+        values = frame.values
+        if scale.get('clear_value') is not None:
+            values = np.where(np.isnan(values), scale['clear_value'], values)
+        
+        masks = zonal_masks.get(polygons, frame.grid)
+        with metrics.span('zonal_stats'):
+            stats = zonal.zonal_stats(values, frame.grid, masks, threshold)
+        
+        columns = zip(
+            [polygon_id for polygon_id, _ in polygons],
+            stats['pixels'].tolist(),
+            stats['valid_pixels'].tolist(),
+            _none_if_nan(stats['min'], 2),
+            _none_if_nan(stats['mean'], 2),
+            _none_if_nan(stats['max'], 2),
+            _none_if_nan(stats['area_km2'], 1),
+            _none_if_nan(stats['area_over_threshold_km2'], 1),
+        )
+        results = [{
+            'id': polygon_id,
+            'pixels': pixels,
+            'valid_pixels': valid,
+            'min': vmin,
+            'mean': vmean,
+            'max': vmax,
+            'area_km2': area,
+            'area_over_threshold_km2': over
+        } for polygon_id, pixels, valid, vmin, vmean, vmax, area, over in columns]
+        
+        return jsonify({
+            'station': station,
+            'layer': layer_id,
+            'time': frame.scan_time.isoformat(),
+            'units': scale['units'],
+            'threshold': threshold,
+            'polygons': results,
+            'count': len(results)
+        })
+    except UpstreamShed:
+        return _shed_response()
+    except Exception as e:
+        app.logger.error(f"Error computing zonal statistics: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Default range of archive queries
+ARCHIVE_DEFAULT_MINUTES = 360
+
+def _range_args():
+    """Parse from=/to= (minutes back, or ISO8601 times) of archive and export queries; raises ValueError"""
+    try:
+        start = parse_since(request.args.get('from') or str(ARCHIVE_DEFAULT_MINUTES))
+    except ValueError as e:
+        raise ValueError(f'from: {e}') from None
+    try:
+        end = parse_since(request.args['to']) if request.args.get('to') else datetime.now(timezone.utc)
+    except ValueError as e:
+        raise ValueError(f'to: {e}') from None
+    return start, end
+
+@app.route('/api/radar/archive')
+def radar_archive():
+    """Archived scans of a station/layer between from= and to="""
+    if frame_archive is None:
+        return jsonify({'error': 'Archive is not enabled (set RADAR_ARCHIVE_DIR)'}), 404
+    try:
+        station, layer_id = _frame_request_args()
+        start, end = _range_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    entries = frame_archive.frames(station, layer_id, start, end)
+    frames = [{
+        'time': entry.time.isoformat(),
+        'url': url_for('radar_archive_frame', station=station, layer=layer_id, time=entry.time.isoformat()),
+        'bytes': entry.length,
+        'source': entry.source,
+        'bounds': georef.grid_from_url(entry.url).describe()['bounds']
+    } for entry in entries]
+    return jsonify({
+        'station': station,
+        'layer': layer_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'frames': frames,
+        'count': len(frames)
+    })
+
+@app.route('/api/radar/archive/frame')
+def radar_archive_frame():
+    """One archived scan as PNG, streamed from the mapped segment"""
+    if frame_archive is None:
+        return jsonify({'error': 'Archive is not enabled (set RADAR_ARCHIVE_DIR)'}), 404
+    try:
+        station, layer_id = _frame_request_args()
+        scan = parse_wms_time(request.args['time'])
+    except KeyError:
+        return jsonify({'error': 'time is required'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    entry = frame_archive.frame(station, layer_id, scan)
+    if entry is None:
+        return jsonify({'error': 'Scan not in the archive'}), 404
+    response = Response(frame_archive.iter_content(entry), mimetype='image/png')
+    response.content_length = entry.length
+    response.headers['X-Radar-Time'] = entry.time.isoformat()
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+# Frames in one export at most, and frames fetched or buffered ahead of the stream
+EXPORT_MAX_FRAMES = 2000
+EXPORT_WINDOW = 8
+
+def plan_export(stations, layer_ids, start, end):
+    """
+    Frames of an export: (station, layer_id, scan time, WMS time, archived entry).
+
+    Scans are those advertised by the capabilities plus those in the
+    archive (either of the last two may be None), oldest first per layer.
+    """
+    for station in stations:
+        for layer_id in layer_ids:
+            scans = {}
+            for t in get_layer_times(layer_id, station):
+                scan = parse_wms_time(t)
+                if start <= scan <= end:
+                    scans[scan] = [t, None]
+            if frame_archive is not None:
+                for entry in frame_archive.frames(station, layer_id, start, end):
+                    scans.setdefault(entry.time, [None, None])[1] = entry
+            for scan in sorted(scans):
+                yield (station, layer_id, scan, *scans[scan])
+
+def export_frames(plan, window=EXPORT_WINDOW):
+    """
+    (metadata, PNG bytes) of every planned frame, in plan order.
+
+    Frames come from the frame store when cached, else from the archive,
+    else from upstream at backfill priority on the frame store's pool.
+    At most window frames are fetched or held ahead of the consumer.
+    """
+    def start(item):
+        station, layer_id, _, wms_time, archived = item
+        cached = frame_store.get(station, layer_id, wms_time) if wms_time else None
+        if cached is not None:
+            return item, 'cache', cached
+        if archived is not None:
+            return item, 'archive', archived
+        return item, 'upstream', frame_store.submit(station, layer_id, wms_time, budget.BACKFILL)
+    
+    def finish(item, origin, source):
+        station, layer_id, scan, _, _ = item
+        meta = {
+            'name': f"{station}/{layer_id}/{scan.strftime('%Y%m%dT%H%M%SZ')}.png",
+            'station': station,
+            'layer': layer_id,
+            'time': scan.isoformat(),
+            'origin': origin
+        }
+        content = url = None
+        if origin == 'archive':
+            content, url = frame_archive.read(source), source.url
+            meta['candidate'] = source.source
+        else:
+            frame = source
+            if origin == 'upstream':
+                try:
+                    frame = source.result()
+                except UpstreamShed:
+                    frame = None
+                    meta['error'] = 'shed'
+                except Exception:
+                    frame = None
+            if frame is not None:
+                content, url = frame.content, frame.url
+                meta['candidate'] = frame.source
+            else:
+                meta.setdefault('error', 'unavailable')
+        if content is not None:
+            meta['bytes'] = len(content)
+            meta['bounds'] = georef.grid_from_url(url).describe()['bounds']
+        return meta, content
+    
+    pending = deque()
+    for item in plan:
+        pending.append(start(item))
+        if len(pending) >= window:
+            yield finish(*pending.popleft())
+    while pending:
+        yield finish(*pending.popleft())
+
+@app.route('/api/radar/export')
+def radar_export():
+    """Stream the frames of stations x layers between from= and to= as tar, zip or NDJSON"""
+    fmt = request.args.get('format', 'tar')
+    if fmt not in export.EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {list(export.EXPORT_FORMATS)}'}), 400
+    stations = [v.strip().upper() for v in request.args.get('stations', RADAR_STATION).split(',') if v.strip()]
+    layer_ids = [v.strip() for v in request.args.get('layers', current_weather_layer).split(',') if v.strip()]
+    invalid = [v for v in stations if v not in RADAR_STATIONS] + [v for v in layer_ids if v not in WEATHER_LAYERS]
+    if not stations or not layer_ids or invalid:
+        return jsonify({'error': f'Invalid stations or layers: {", ".join(invalid)}'}), 400
+    # Validated before the stream starts: errors after the first byte can only truncate it
+    try:
+        start, end = _range_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start > end:
+        return jsonify({'error': 'from must not be after to'}), 400
+    limit = min(request.args.get('limit', EXPORT_MAX_FRAMES, type=int), EXPORT_MAX_FRAMES)
+    if limit < 0:
+        return jsonify({'error': 'limit must not be negative'}), 400
+    
+    plan = islice(plan_export(stations, layer_ids, start, end), limit)
+    response = Response(export.STREAMS[fmt](export_frames(plan)), mimetype=export.EXPORT_FORMATS[fmt])
+    name = f"radar-{start.strftime('%Y%m%dT%H%M')}-{end.strftime('%Y%m%dT%H%M')}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metrics of this process in Prometheus text format"""
+    return Response(metrics.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def _profiler_allowed():
+    """The profiler is off unless PROFILER_TOKEN is set and sent in X-Profiler-Token"""
+    token = os.environ.get('PROFILER_TOKEN')
+    sent = request.headers.get('X-Profiler-Token', '')
+    return bool(token) and hmac.compare_digest(sent.encode(), token.encode())
+
+@app.route('/api/debug/profiler', methods=['GET', 'POST'])
+def sampling_profiler():
+    """Start/stop the sampling profiler (POST) or read its collapsed stacks (GET)"""
+    if not _profiler_allowed():
+        return jsonify({'error': 'Not found'}), 404
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        action = data.get('action')
+        if action == 'start':
+            try:
+                interval_ms = float(data.get('interval_ms', 10))
+            except (TypeError, ValueError):
+                interval_ms = None
+            # Also rejects NaN and infinity
+            if interval_ms is None or not 0 < interval_ms < float('inf'):
+                return jsonify({'error': 'interval_ms must be a positive number'}), 400
+            started = metrics.profiler.start(interval_ms / 1000.0)
+            app.logger.info(f"Sampling profiler start requested (interval {interval_ms} ms): {started}")
+        elif action == 'stop':
+            metrics.profiler.stop()
+        else:
+            return jsonify({'error': "action must be 'start' or 'stop'"}), 400
+        return jsonify(metrics.profiler.status())
+    
+    if request.args.get('format') == 'collapsed':
+        limit = request.args.get('limit', type=int)
+        return Response(metrics.profiler.collapsed(limit), mimetype='text/plain')
+    return jsonify(metrics.profiler.status())
+
 @app.route('/api/radar/last')
 def radar_last_image():
     """Serve the last saved radar image if available."""
@@ -902,7 +1825,6 @@ def radar_last_image():
         return jsonify({'error': 'No saved image'}), 404
 
 if __name__ == '__main__':
-    import os
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
     
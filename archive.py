@@ -0,0 +1,323 @@
+"""
+Frame archive
+Records every scan the app loads to an on-disk timeline per (station,
+layer) so events can be replayed later, and serves time-range queries
+from it through memory maps.
+
+Layout under the archive directory:
+
+    <STATION>/<layer_id>/<start ms>-<pid>.bin    PNG bytes, appended
+    <STATION>/<layer_id>/<start ms>-<pid>.idx    time index, one fixed-size record per scan
+    <STATION>/<layer_id>/<start ms>-<pid>.json   segment metadata (request URL and source)
+
+A segment holds scans of one request grid; it is closed when it reaches
+SEGMENT_BYTES or spans SEGMENT_SECONDS.  Each process writes its own
+segments, so gunicorn workers never append to the same file; readers merge
+them and drop duplicate scan times.  Index records are appended after the
+PNG bytes they point to, so a reader never sees a record without its data.
+"""
+import hashlib
+import json
+import mmap
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+import metrics
+
+ARCHIVE_VERSION = 1
+
+# Index record: scan time (ms since the epoch), PNG offset and length, content digest
+INDEX_DTYPE = np.dtype([('time', '<i8'), ('offset', '<i8'), ('length', '<u4'), ('digest', 'S8')])
+
+# Segment limits
+SEGMENT_BYTES = 64 * 1024 * 1024
+SEGMENT_SECONDS = 6 * 3600
+
+# Frames waiting to be written; more are dropped rather than queued
+RECORD_QUEUE_SIZE = 256
+
+# Retention is enforced at most this often (seconds)
+RETENTION_INTERVAL = 300
+
+# Chunk size used when streaming archived PNGs
+STREAM_CHUNK = 64 * 1024
+
+ArchivedFrame = namedtuple('ArchivedFrame', 'station layer_id time url source segment offset length digest')
+
+
+def _time_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+def _from_ms(value):
+    return datetime.fromtimestamp(value / 1000.0, timezone.utc)
+
+
+class _Segment:
+    """The segment a process is currently appending to for one (station, layer)"""
+
+    def __init__(self, base, grid_key, source, start_ms):
+        self.base = base
+        self.grid_key = grid_key
+        self.source = source
+        self.start_ms = start_ms
+        self.size = 0
+        self.digests = {}
+
+
+class FrameArchive:
+    """
+    Append-only archive of radar frames with retention by age and size.
+
+    record() only queues the frame; a writer thread (started per process
+    on first use) appends it, skipping scans already archived and storing
+    the bytes of a frame identical to one already in the segment only once.
+    """
+
+    def __init__(self, directory, max_age_hours=48.0, max_bytes=2 * 1024 ** 3, logger=None):
+        self.directory = directory
+        self.max_age = max_age_hours * 3600.0
+        self.max_bytes = max_bytes
+        self._logger = logger
+        self._queue = queue.Queue(maxsize=RECORD_QUEUE_SIZE)
+        self._segments = {}
+        self._recorded = {}
+        self._pid = None
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._indexes_lock = threading.Lock()
+        self._maps = OrderedDict()
+        self._maps_lock = threading.Lock()
+        self._retained_at = 0.0
+
+    # Writing
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Segments open in a parent process belong to it
+            self._segments = {}
+            threading.Thread(target=self._run, name='frame-archive', daemon=True).start()
+
+    def record(self, frame):
+        """Queue a frame for archiving under its scan time (fetch time when untimed)"""
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            metrics.ARCHIVE_FRAMES.inc(result='dropped')
+
+    def _run(self):
+        while True:
+            try:
+                frame = self._queue.get(timeout=RETENTION_INTERVAL)
+            except queue.Empty:
+                frame = None
+            if frame is not None:
+                try:
+                    self.write(frame)
+                except OSError as e:
+                    metrics.ARCHIVE_FRAMES.inc(result='error')
+                    if self._logger:
+                        self._logger.warning(f"Archiving {frame.key} failed: {e}")
+            if time.monotonic() - self._retained_at >= RETENTION_INTERVAL:
+                self._retained_at = time.monotonic()
+                try:
+                    self.enforce_retention()
+                except OSError as e:
+                    if self._logger:
+                        self._logger.warning(f"Archive retention in {self.directory} failed: {e}")
+
+    def _layer_dir(self, station, layer_id):
+        return os.path.join(self.directory, station, layer_id)
+
+    def _recorded_times(self, station, layer_id):
+        """Scan times (ms) already archived for a station/layer, loaded once per process"""
+        key = (station, layer_id)
+        times = self._recorded.get(key)
+        if times is None:
+            times = self._recorded[key] = {int(t) for t in self._records(station, layer_id)['time']}
+        return times
+
+    def write(self, frame):
+        """Append a frame to its segment (writer thread); returns True if it was added"""
+        scan_ms = _time_ms(frame.scan_time)
+        recorded = self._recorded_times(frame.station, frame.layer_id)
+        if scan_ms in recorded:
+            metrics.ARCHIVE_FRAMES.inc(result='duplicate')
+            return False
+
+        content = frame.content
+        digest = hashlib.blake2b(content, digest_size=8).digest()
+        grid_key = (frame.grid.key, frame.source)
+        key = (frame.station, frame.layer_id)
+        segment = self._segments.get(key)
+        if (segment is None or segment.grid_key != grid_key or segment.size >= SEGMENT_BYTES
+                or scan_ms - segment.start_ms >= SEGMENT_SECONDS * 1000
+                or not os.path.exists(segment.base + '.bin')):
+            segment = self._segments[key] = self._open_segment(frame, grid_key, scan_ms)
+
+        stored = segment.digests.get(digest)
+        if stored is None:
+            with open(segment.base + '.bin', 'ab') as out:
+                out.write(content)
+            stored = segment.digests[digest] = (segment.size, len(content))
+            segment.size += len(content)
+            metrics.ARCHIVE_FRAMES.inc(result='written')
+        else:
+            # Same image under another scan time: index it, store nothing
+            metrics.ARCHIVE_FRAMES.inc(result='deduplicated')
+        record = np.array([(scan_ms, stored[0], stored[1], digest)], dtype=INDEX_DTYPE)
+        with open(segment.base + '.idx', 'ab') as out:
+            out.write(record.tobytes())
+        recorded.add(scan_ms)
+        return True
+
+    def _open_segment(self, frame, grid_key, start_ms):
+        directory = self._layer_dir(frame.station, frame.layer_id)
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f'{start_ms}-{os.getpid()}')
+        with open(base + '.json', 'w') as f:
+            json.dump({'version': ARCHIVE_VERSION, 'station': frame.station, 'layer_id': frame.layer_id,
+                       'url': frame.url, 'source': frame.source}, f)
+        return _Segment(base, grid_key, frame.source, start_ms)
+
+    # Retention
+
+    def _all_segments(self):
+        """[(base, end time ms, bytes)] of every segment on disk"""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                base = os.path.join(root, name[:-len('.json')])
+                records = self._index(base)
+                end = int(records['time'].max()) if len(records) else int(os.path.getmtime(base + '.json') * 1000)
+                size = sum(os.path.getsize(base + ext) for ext in ('.bin', '.idx', '.json')
+                           if os.path.exists(base + ext))
+                found.append((base, end, size))
+        return found
+
+    def enforce_retention(self, now=None):
+        """Delete segments past max_age, then the oldest ones until under max_bytes; returns the count"""
+        now_ms = (time.time() if now is None else now) * 1000.0
+        segments = sorted(self._all_segments(), key=lambda s: s[1])
+        total = sum(size for _, _, size in segments)
+        removed = 0
+        for base, end, size in segments:
+            if end >= now_ms - self.max_age * 1000.0 and total <= self.max_bytes:
+                break
+            for ext in ('.idx', '.bin', '.json'):
+                try:
+                    os.remove(base + ext)
+                except FileNotFoundError:
+                    pass
+            with self._indexes_lock:
+                self._indexes.pop(base, None)
+            total -= size
+            removed += 1
+        if removed:
+            # Times of deleted scans may be recorded again
+            self._recorded = {}
+            with self._maps_lock:
+                self._maps.clear()
+        return removed
+
+    # Reading
+
+    def _index(self, base):
+        """Index records of a segment, re-read only when the index grew"""
+        try:
+            size = os.path.getsize(base + '.idx')
+        except OSError:
+            with self._indexes_lock:
+                self._indexes.pop(base, None)
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        with self._indexes_lock:
+            cached = self._indexes.get(base)
+        if cached is None or cached[0] != size:
+            count = size // INDEX_DTYPE.itemsize
+            records = np.fromfile(base + '.idx', dtype=INDEX_DTYPE, count=count)
+            cached = (size, records)
+            with self._indexes_lock:
+                self._indexes[base] = cached
+        return cached[1]
+
+    def _segment_bases(self, station, layer_id):
+        directory = self._layer_dir(station, layer_id)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        return sorted(os.path.join(directory, n[:-len('.json')]) for n in names if n.endswith('.json'))
+
+    def _records(self, station, layer_id):
+        parts = [self._index(base) for base in self._segment_bases(station, layer_id)]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=INDEX_DTYPE)
+
+    def frames(self, station, layer_id, start=None, end=None):
+        """Archived frames of a station/layer with start <= scan time <= end, oldest first"""
+        lo = _time_ms(start) if start is not None else None
+        hi = _time_ms(end) if end is not None else None
+        found = {}
+        for base in self._segment_bases(station, layer_id):
+            records = self._index(base)
+            keep = np.ones(len(records), dtype=bool)
+            if lo is not None:
+                keep &= records['time'] >= lo
+            if hi is not None:
+                keep &= records['time'] <= hi
+            if not keep.any():
+                continue
+            try:
+                with open(base + '.json') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for record in records[keep]:
+                t = int(record['time'])
+                # Several workers may have archived the same scan
+                if t not in found:
+                    found[t] = ArchivedFrame(station, layer_id, _from_ms(t), meta['url'], meta['source'],
+                                             base, int(record['offset']), int(record['length']),
+                                             record['digest'].hex())
+        return [found[t] for t in sorted(found)]
+
+    def frame(self, station, layer_id, scan_time):
+        """The archived frame of one scan, or None"""
+        frames = self.frames(station, layer_id, scan_time, scan_time)
+        return frames[0] if frames else None
+
+    def _map(self, base, needed):
+        """Read-only map of a segment's PNG bytes covering at least needed bytes"""
+        with self._maps_lock:
+            entry = self._maps.get(base)
+            if entry is None or len(entry) < needed:
+                with open(base + '.bin', 'rb') as f:
+                    entry = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                self._maps[base] = entry
+                while len(self._maps) > 32:
+                    self._maps.popitem(last=False)
+            self._maps.move_to_end(base)
+            return entry
+
+    def read(self, entry):
+        """PNG bytes of an archived frame as a memoryview into the mapped segment"""
+        data = self._map(entry.segment, entry.offset + entry.length)
+        return data[entry.offset:entry.offset + entry.length]
+
+    def iter_content(self, entry, chunk=STREAM_CHUNK):
+        """PNG bytes of an archived frame in chunks, for streaming responses"""
+        data = self.read(entry)
+        for start in range(0, len(data), chunk):
+            yield bytes(data[start:start + chunk])
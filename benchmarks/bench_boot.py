@@ -0,0 +1,142 @@
+"""
+Import and worker boot benchmark
+Measures `import app` with `python -X importtime`, the resident memory of
+a process that has imported it, and (when gunicorn is installed) worker
+boot time and per-worker private memory with and without preloading.
+
+    python benchmarks/bench_boot.py [--runs 5] [--budget-ms 750] [--workers 2]
+
+Prints a JSON report and exits non-zero when the import is over budget or
+a lazily imported stack (Pillow, ElementTree) is imported by `import app`.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use only; `import app` must not pull them in
+LAZY_MODULES = ('PIL.Image', 'xml.etree.ElementTree')
+
+
+def app_env():
+    # No snapshot restore: this measures the code, not the cache
+    return dict(os.environ, RADAR_SNAPSHOT_DIR='')
+
+
+def import_times():
+    """{module: (self us, cumulative us)} from one `python -X importtime -c 'import app'`"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=app_env(),
+                          capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def import_rss_kb():
+    code = 'import resource, app; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+    proc = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=app_env(),
+                          capture_output=True, text=True, check=True)
+    return int(proc.stdout.split()[-1])
+
+
+def private_kb(pid):
+    """Private (unshared) memory of a process from /proc/<pid>/smaps_rollup"""
+    total = 0
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1])
+    return total
+
+
+def gunicorn_boot(config, workers, deadline=60.0):
+    """Boot gunicorn with a config file; returns time to first response and worker memory"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = dict(app_env(), PORT=str(port), WEB_CONCURRENCY=str(workers))
+    start = time.perf_counter()
+    proc = subprocess.Popen(['gunicorn', '--chdir', ROOT, '-c', config, '-b', f'127.0.0.1:{port}',
+                             '-w', str(workers), 'app:app'],
+                            cwd=tempfile.gettempdir(), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if time.perf_counter() - start > deadline:
+                raise RuntimeError('gunicorn did not answer')
+            try:
+                if requests.get(f'http://127.0.0.1:{port}/api/weather/current-layer', timeout=5).ok:
+                    break
+            except requests.ConnectionError:
+                time.sleep(0.02)
+        first_ms = (time.perf_counter() - start) * 1000.0
+        # Let every worker finish booting before reading their memory
+        time.sleep(1.0)
+        children = subprocess.run(['pgrep', '-P', str(proc.pid)], capture_output=True, text=True).stdout.split()
+        worker_private = [private_kb(int(pid)) for pid in children]
+        return {
+            'first_response_ms': round(first_ms, 1),
+            'workers': len(worker_private),
+            'master_private_kb': private_kb(proc.pid),
+            'worker_private_kb': worker_private,
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=750.0)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    import_ms = statistics.median(r['app'][1] for r in runs) / 1000.0
+    last = runs[-1]
+    slowest = sorted(last.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    eager = [name for name in LAZY_MODULES if name in last]
+
+    report = {
+        'benchmark': 'boot',
+        'import_app_ms': round(import_ms, 1),
+        'budget_ms': args.budget_ms,
+        'modules_imported': len(last),
+        'slowest_self_ms': {name: round(own / 1000.0, 2) for name, (own, _) in slowest},
+        'eagerly_imported_lazy_modules': eager,
+        'import_max_rss_kb': import_rss_kb(),
+    }
+
+    if shutil.which('gunicorn') and os.path.exists('/proc/self/smaps_rollup'):
+        empty = tempfile.NamedTemporaryFile('w', suffix='.conf.py', delete=False)
+        empty.close()
+        try:
+            report['gunicorn'] = {
+                'preload': gunicorn_boot(os.path.join(ROOT, 'gunicorn.conf.py'), args.workers),
+                'no_preload': gunicorn_boot(empty.name, args.workers),
+            }
+        finally:
+            os.unlink(empty.name)
+
+    report['within_budget'] = import_ms <= args.budget_ms and not eager
+    print(json.dumps(report, indent=2))
+    return 0 if report['within_budget'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Storm cell pipeline benchmark
+Times PNG decode, palette decode and cell segmentation on synthetic
+reflectivity frames and checks them against storm_cells.FRAME_BUDGET_MS.
+
+    python benchmarks/bench_cells.py [--frames N] [--size 2048x1728]
+
+Prints a JSON report and exits non-zero when the median frame time is
+over budget.  p99 is reported too, but with a handful of frames it is
+effectively the slowest one, so it is not gated on.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import georef  # noqa: E402
+import storm_cells  # noqa: E402
+from palettes import PALETTES, decode_values, get_lut  # noqa: E402
+
+BBOX = (-84.7, 38.9, -78.7, 43.9)
+
+
+def render_frame(width, height, seed, shift, cells=30):
+    """Render a PNG of gaussian storm cells drawn with the reflectivity palette"""
+    out = BytesIO()
+    Image.fromarray(render_rgba(width, height, seed, shift, cells)).save(out, 'PNG')
+    return out.getvalue()
+
+
+def render_rgba(width, height, seed, shift, cells=30):
+    """RGBA array of gaussian storm cells drawn with the reflectivity palette"""
+    palette = PALETTES['reflectivity']['colors']
+    levels = np.array([v for v, _ in palette], dtype=np.float32)
+    colors = np.array([c for _, c in palette], dtype=np.uint8)
+
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    field = np.zeros((height, width), dtype=np.float32)
+    for _ in range(cells):
+        cy, cx = rng.uniform(0.1, 0.9) * height, rng.uniform(0.1, 0.9) * width
+        radius = rng.uniform(15, 60)
+        peak = rng.uniform(35, 68)
+        field = np.maximum(field, peak * np.exp(-((yy - cy) ** 2 + (xx - cx - shift) ** 2) / (2 * radius ** 2)))
+
+    band = np.searchsorted(levels, field, side='right') - 1
+    rgba = np.zeros((height, width, 4), dtype=np.uint8)
+    echo = band >= 0
+    rgba[echo, :3] = colors[band[echo]]
+    rgba[echo, 3] = 255
+    return rgba
+
+
+def percentile(samples, q):
+    return float(np.percentile(np.asarray(samples), q)) if samples else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, default=10)
+    parser.add_argument('--size', default='2048x1728')
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.lower().split('x'))
+
+    pngs = [render_frame(width, height, seed=7, shift=i * 8) for i in range(args.frames)]
+    get_lut('reflectivity')  # one-off table build is not part of the per-frame cost
+
+    stages = {'png_decode': [], 'palette_decode': [], 'detect': [], 'frame': []}
+    history = []
+    start_time = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i, png in enumerate(pngs):
+        t0 = time.perf_counter()
+        with Image.open(BytesIO(png)) as image:
+            rgba = np.asarray(image.convert('RGBA'))
+        t1 = time.perf_counter()
+        values = decode_values(rgba, 'reflectivity')
+        t2 = time.perf_counter()
+        cells = storm_cells.detect_cells(values, georef.grid(BBOX, values.shape[1], values.shape[0]))
+        t3 = time.perf_counter()
+        stages['png_decode'].append((t1 - t0) * 1000)
+        stages['palette_decode'].append((t2 - t1) * 1000)
+        stages['detect'].append((t3 - t2) * 1000)
+        stages['frame'].append((t3 - t0) * 1000)
+        history.append((start_time + timedelta(minutes=5 * i), cells))
+
+    t0 = time.perf_counter()
+    tracked = storm_cells.track_cells(history)
+    track_ms = (time.perf_counter() - t0) * 1000
+
+    frame_p50 = percentile(stages['frame'], 50)
+    report = {
+        'benchmark': 'cells',
+        'frame_size': [width, height],
+        'frames': args.frames,
+        'stages_ms': {
+            name: {'p50': round(percentile(s, 50), 2), 'p99': round(percentile(s, 99), 2)}
+            for name, s in stages.items()
+        },
+        'track_ms': round(track_ms, 2),
+        'cells': len(tracked),
+        'budget_ms': storm_cells.FRAME_BUDGET_MS,
+        'within_budget': frame_p50 <= storm_cells.FRAME_BUDGET_MS,
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if report['within_budget'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+HTTP load benchmark
+Runs the Flask app in a threaded server against the local mock GeoServer
+(mock_noaa.py) and measures latency percentiles and throughput of the main
+routes at increasing concurrency.
+
+    python benchmarks/bench_http.py [--concurrency 1,4,16] [--requests 60]
+        [--latency-ms 50] [--error-rate 0.0] [--upstream-rate 1000]
+        [--output report.json] [--baseline previous.json --tolerance 0.25]
+
+Latency and throughput cover only responses that went through the normal
+path; responses shed by the upstream budget (X-Radar-Stale, a 'throttled'
+status or 503) are counted separately.  The app's budget is raised to
+--upstream-rate so the scenarios measure the upstream path, not shedding.
+
+Prints a JSON report.  With --baseline, each row also carries its change in
+p99 against the matching row of an earlier report, and the run fails when
+any p99 regressed by more than the tolerance.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_cells import percentile  # noqa: E402
+from mock_noaa import MockGeoServer  # noqa: E402
+
+STATIONS = ['KCLE', 'KLWX', 'KPBZ', 'KBUF']
+LAYERS = ['reflectivity', 'composite_reflectivity', 'super_res_reflectivity']
+
+# Responses the app answered without calling upstream because the budget shed it
+SHED_OUTCOMES = ('stale', 'throttled', 'unavailable')
+OUTCOMES = ('ok',) + SHED_OUTCOMES + ('error',)
+
+
+def scenarios(app_module):
+    """name -> callable(session, base_url, i) issuing one request"""
+    lat, lon = app_module.get_radar_coords()
+
+    def radar(session, base, i):
+        return session.get(f'{base}/api/radar')
+
+    def value(session, base, i):
+        # Walk points around the station so lookups do not all hit one pixel
+        return session.get(f'{base}/api/radar/value',
+                           params={'lat': lat + (i % 17 - 8) * 0.05, 'lon': lon + (i % 13 - 6) * 0.05})
+
+    def status(session, base, i):
+        return session.get(f'{base}/api/radar/status')
+
+    def station_switch(session, base, i):
+        return session.post(f'{base}/api/radar/station', json={'station_id': STATIONS[i % len(STATIONS)]})
+
+    def layer_switch(session, base, i):
+        return session.post(f'{base}/api/weather/layer', json={'layer_id': LAYERS[i % len(LAYERS)]})
+
+    return {
+        'radar': radar,
+        'value': value,
+        'status': status,
+        'station_switch': station_switch,
+        'layer_switch': layer_switch,
+    }
+
+
+def classify(response):
+    """How a response was served: ok, stale, throttled, unavailable or error"""
+    if response.status_code == 503:
+        return 'unavailable'
+    if response.status_code >= 500:
+        return 'error'
+    if response.headers.get('X-Radar-Stale') == 'true':
+        return 'stale'
+    if response.headers.get('Content-Type', '').startswith('application/json'):
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and body.get('status') == 'throttled':
+            return 'throttled'
+    return 'ok'
+
+
+def run_level(call, base, concurrency, total):
+    """
+    Issue total requests from concurrency threads; returns the row of the report.
+
+    Latency and throughput are over 'ok' responses only; shed responses
+    (stale, throttled, 503) never reach upstream and are only counted.
+    """
+    local = threading.local()
+    counter = count()
+    latencies = []
+    outcomes = dict.fromkeys(OUTCOMES, 0)
+    lock = threading.Lock()
+
+    def worker():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            start = time.perf_counter()
+            try:
+                outcome = classify(call(local.session, base, i))
+            except requests.RequestException:
+                outcome = 'error'
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == 'ok':
+                    latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - start
+    return {
+        'concurrency': concurrency,
+        'requests': sum(outcomes.values()),
+        'ok': outcomes['ok'],
+        'shed': {name: outcomes[name] for name in SHED_OUTCOMES},
+        'errors': outcomes['error'],
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+        'throughput_rps': round(len(latencies) / wall, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Annotate rows with their p99 change against a baseline report; returns the regressions"""
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline.get('results', [])}
+    regressions = []
+    for row in results:
+        before = previous.get((row['scenario'], row['concurrency']))
+        if not before or not before.get('p99_ms') or row['p99_ms'] is None:
+            continue
+        change = row['p99_ms'] / before['p99_ms'] - 1.0
+        row['baseline_p99_ms'] = before['p99_ms']
+        row['p99_change'] = round(change, 3)
+        if change > tolerance:
+            regressions.append(f"{row['scenario']}@{row['concurrency']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--requests', type=int, default=60, help='requests per scenario and level')
+    parser.add_argument('--scenarios', default='radar,value,status,station_switch,layer_switch')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='mock upstream latency')
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--hang-s', type=float, default=25.0)
+    parser.add_argument('--upstream-rate', type=float, default=1000.0,
+                        help='UPSTREAM_RATE for the app; high enough that requests exercise the upstream path')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    levels = [int(v) for v in args.concurrency.split(',')]
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    mock = MockGeoServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                         timeout_rate=args.timeout_rate, hang_s=args.hang_s, seed=0).start()
+    # The upstream base URL is read when the app is imported; snapshots stay off
+    # so mock frames are neither restored nor left behind
+    os.environ['NOAA_GEOSERVER'] = mock.url
+    os.environ['RADAR_SNAPSHOT_DIR'] = ''
+    os.environ['UPSTREAM_RATE'] = str(args.upstream_rate)
+    os.environ['UPSTREAM_BURST'] = str(2 * args.upstream_rate)
+    os.environ['WEB_CONCURRENCY'] = '1'
+    import app as app_module
+    from werkzeug.serving import make_server
+    app_module.app.logger.setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    # /api/radar saves last_radar.png in the working directory
+    workdir = tempfile.mkdtemp(prefix='bench-http-')
+    os.chdir(workdir)
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    calls = scenarios(app_module)
+    results = []
+    try:
+        for name in args.scenarios.split(','):
+            call = calls[name]
+            # One untimed request builds the synthetic frames and warms lookup tables
+            call(requests.Session(), base, 0)
+            for level in levels:
+                row = run_level(call, base, level, max(args.requests, level))
+                row['scenario'] = name
+                results.append(row)
+            # Leave the switch routes where the other scenarios expect them
+            requests.post(f'{base}/api/radar/station', json={'station_id': STATIONS[0]})
+            requests.post(f'{base}/api/weather/layer', json={'layer_id': LAYERS[0]})
+    finally:
+        server.shutdown()
+        mock.stop()
+
+    report = {
+        'benchmark': 'http',
+        'mock': {
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'error_rate': args.error_rate,
+            'timeout_rate': args.timeout_rate,
+            'upstream_requests': mock.requests,
+            'fixtures': mock.fixtures(),
+        },
+        'upstream_rate': args.upstream_rate,
+        'results': results,
+    }
+    regressions = []
+    if args.baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        report['regressions'] = regressions
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
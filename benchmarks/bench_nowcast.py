@@ -0,0 +1,75 @@
+"""
+Nowcast benchmark
+Times motion estimation and advection of all lead times on synthetic
+frames and checks the total against nowcast.NOWCAST_BUDGET_MS.
+
+    python benchmarks/bench_nowcast.py [--runs N] [--size 2048x1728]
+
+Prints a JSON report and exits non-zero when the p99 run is over budget.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nowcast  # noqa: E402
+from bench_cells import percentile, render_frame  # noqa: E402
+from palettes import decode_values  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--size', default='2048x1728')
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.lower().split('x'))
+
+    start_time = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    history = []
+    latest = None
+    for i in range(nowcast.MOTION_FRAMES):
+        with Image.open(BytesIO(render_frame(width, height, seed=11, shift=i * 20))) as image:
+            latest = np.asarray(image.convert('RGBA'))
+        intensity = np.nan_to_num(decode_values(latest, 'reflectivity'), nan=0.0)
+        history.append((start_time + timedelta(minutes=5 * i), intensity))
+
+    stages = {'motion': [], 'advect_encode': [], 'total': []}
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        motion = nowcast.estimate_motion(history)
+        t1 = time.perf_counter()
+        flow = nowcast.upsample_motion(motion, latest.shape[:2])
+        for lead in nowcast.NOWCAST_LEADS:
+            nowcast.encode_png(nowcast.advect(latest, flow, lead))
+        t2 = time.perf_counter()
+        stages['motion'].append((t1 - t0) * 1000)
+        stages['advect_encode'].append((t2 - t1) * 1000)
+        stages['total'].append((t2 - t0) * 1000)
+
+    total_p99 = percentile(stages['total'], 99)
+    report = {
+        'benchmark': 'nowcast',
+        'frame_size': [width, height],
+        'leads': list(nowcast.NOWCAST_LEADS),
+        'runs': args.runs,
+        'stages_ms': {
+            name: {'p50': round(percentile(s, 50), 2), 'p99': round(percentile(s, 99), 2)}
+            for name, s in stages.items()
+        },
+        'budget_ms': nowcast.NOWCAST_BUDGET_MS,
+        'within_budget': total_p99 <= nowcast.NOWCAST_BUDGET_MS,
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if report['within_budget'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
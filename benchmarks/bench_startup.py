@@ -0,0 +1,115 @@
+"""
+Warm start benchmark
+Boots the app twice against the mock GeoServer: once cold, and once from
+the snapshot the first process left behind.  Reports time to the first
+successful response and the upstream requests each boot needed.
+
+    python benchmarks/bench_startup.py [--latency-ms 150]
+
+Prints a JSON report and exits non-zero when the warm boot still fetched
+frames from upstream.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_noaa import MockGeoServer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER = 'super_res_reflectivity'
+STATION = 'KCLE'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def first_response(url, deadline):
+    """Poll url until it answers 200; returns seconds waited"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < deadline:
+        try:
+            if requests.get(url, timeout=deadline).status_code == 200:
+                return time.perf_counter() - start
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f'No response from {url} within {deadline} s')
+
+
+def boot(mock, env, workdir, deadline):
+    """Start the app, time its first frame and history responses, then stop it"""
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    before = dict(mock.counts)
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'app.py')], env=dict(env, PORT=str(port)),
+                            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        listening = first_response(f'{base}/api/weather/current-layer', deadline)
+        frame = first_response(f'{base}/api/radar/frame?station={STATION}&layer={LAYER}', deadline)
+        t0 = time.perf_counter()
+        history = requests.get(f'{base}/api/radar/timeseries', timeout=deadline, params={
+            'station': STATION, 'layer': LAYER, 'lat': 41.41, 'lon': -81.86, 'since': '2000-01-01T00:00:00Z'})
+        history_s = time.perf_counter() - t0
+        total = time.perf_counter() - start
+        frames = history.json().get('count', 0)
+    finally:
+        proc.send_signal(signal.SIGINT)
+        proc.wait(timeout=30)
+    return {
+        'listening_ms': round(listening * 1000.0, 1),
+        'first_frame_ms': round(frame * 1000.0, 1),
+        'history_ms': round(history_s * 1000.0, 1),
+        'boot_to_history_ms': round(total * 1000.0, 1),
+        'history_frames': frames,
+        'upstream_getmap': mock.counts.get('getmap', 0) - before.get('getmap', 0),
+        'upstream_capabilities': mock.counts.get('getcapabilities', 0) - before.get('getcapabilities', 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency-ms', type=float, default=150.0, help='mock upstream latency')
+    parser.add_argument('--deadline', type=float, default=60.0)
+    args = parser.parse_args()
+
+    mock = MockGeoServer(latency_ms=args.latency_ms, seed=0).start()
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    snapshot_dir = os.path.join(workdir, 'snapshot')
+    env = dict(os.environ, NOAA_GEOSERVER=mock.url, RADAR_SNAPSHOT_DIR=snapshot_dir,
+               RADAR_SNAPSHOT_INTERVAL='1', FLASK_ENV='production')
+    try:
+        cold = boot(mock, env, workdir, args.deadline)
+        warm = boot(mock, env, workdir, args.deadline)
+    finally:
+        mock.stop()
+
+    report = {
+        'benchmark': 'startup',
+        'upstream_latency_ms': args.latency_ms,
+        'fixtures': mock.fixtures(),
+        'cold': cold,
+        'warm': warm,
+        'first_frame_speedup': round(cold['first_frame_ms'] / max(warm['first_frame_ms'], 0.1), 2),
+        'history_speedup': round(cold['history_ms'] / max(warm['history_ms'], 0.1), 2),
+        'warm_start_effective': warm['upstream_getmap'] == 0 and warm['history_frames'] == cold['history_frames'],
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if report['warm_start_effective'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Zonal statistics benchmark
+Times rasterizing a large polygon set onto a frame grid (a one-off per
+grid) and the per-frame statistics pass over it.
+
+    python benchmarks/bench_zonal.py [--polygons N] [--runs N] [--size 2048x1728]
+
+Prints a JSON report and exits non-zero when the median statistics pass
+is over zonal.ZONAL_STATS_BUDGET_MS.  Parsing and rasterizing happen once
+per polygon set and grid, so they are reported but not gated on.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import georef  # noqa: E402
+import zonal  # noqa: E402
+from bench_cells import percentile  # noqa: E402
+
+BBOX = (-84.7, 38.9, -78.7, 43.9)
+
+
+def random_polygons(count, seed=0):
+    """Small-watershed-sized random star-shaped polygons inside BBOX"""
+    rng = np.random.default_rng(seed)
+    lon_min, lat_min, lon_max, lat_max = BBOX
+    features = []
+    for i in range(count):
+        cx = rng.uniform(lon_min, lon_max)
+        cy = rng.uniform(lat_min, lat_max)
+        n = int(rng.integers(8, 60))
+        angle = np.sort(rng.uniform(0, 2 * np.pi, n))
+        radius = rng.uniform(0.02, 0.08, n)
+        ring = np.stack([cx + radius * np.cos(angle), cy + radius * np.sin(angle)], axis=1).tolist()
+        ring.append(ring[0])
+        features.append({'type': 'Feature', 'id': i, 'geometry': {'type': 'Polygon', 'coordinates': [ring]}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--polygons', type=int, default=3000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--size', default='2048x1728')
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    grid = georef.grid(BBOX, width, height)
+
+    t0 = time.perf_counter()
+    polygons = zonal.parse_polygons(random_polygons(args.polygons))
+    t1 = time.perf_counter()
+    masks = zonal.rasterize(polygons, grid)
+    t2 = time.perf_counter()
+
+    values = np.random.default_rng(1).uniform(0, 5, (height, width)).astype(np.float32)
+    values[values < 1] = np.nan
+    stats_ms = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        zonal.zonal_stats(values, grid, masks, threshold=2.0)
+        stats_ms.append((time.perf_counter() - start) * 1000)
+
+    report = {
+        'benchmark': 'zonal',
+        'frame_size': [width, height],
+        'polygons': args.polygons,
+        'masked_pixels': int(len(masks[0])),
+        'parse_ms': round((t1 - t0) * 1000, 2),
+        'rasterize_ms': round((t2 - t1) * 1000, 2),
+        'stats_ms': {'p50': round(percentile(stats_ms, 50), 2), 'p99': round(percentile(stats_ms, 99), 2)},
+        'budget_ms': zonal.ZONAL_STATS_BUDGET_MS,
+        'within_budget': percentile(stats_ms, 50) <= zonal.ZONAL_STATS_BUDGET_MS,
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if report['within_budget'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Local stand-in for the NOAA GeoServer
+Serves GetCapabilities from the checked-in capabilities.xml (conus
+workspace) and kcle_capabilities.xml (station workspaces, renamed for the
+station asked for), and GetMap from recorded PNGs, falling back to
+synthetic reflectivity frames when nothing has been recorded for a
+request.  Latency, errors and hung requests can be injected.
+
+Recordings are local (benchmarks/recordings/ is not checked in), so a
+fresh checkout serves only synthetic frames.  Those are deterministic:
+the same query always gets the same PNG.  fixtures() says which kind a
+run actually served, and the benchmarks include it in their reports.
+
+    python benchmarks/mock_noaa.py [--port 8081] [--latency-ms 80] [--error-rate 0.05]
+    python benchmarks/mock_noaa.py --record    # proxy to NOAA and save the PNGs
+
+Point the app at it with NOAA_GEOSERVER=http://127.0.0.1:8081/geoserver.
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_cells import render_rgba  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings')
+NOAA_GEOSERVER = 'https://opengeo.ncep.noaa.gov/geoserver'
+
+SERVICE_EXCEPTION = (b'<?xml version="1.0" encoding="UTF-8"?>'
+                     b'<ServiceExceptionReport version="1.3.0"><ServiceException>'
+                     b'Injected error</ServiceException></ServiceExceptionReport>')
+
+
+def load_capabilities(path):
+    """
+    Read a capabilities document.
+
+    capabilities.xml is checked in as one decimal byte value per line;
+    plain XML files are returned as they are.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if content.lstrip()[:1].isdigit():
+        content = bytes(int(v) for v in content.split())
+    return content
+
+
+def recording_name(query):
+    """File name of the recording for a GetMap query"""
+    key = '|'.join(query.get(k, '') for k in ('layers', 'version', 'width', 'height', 'bbox', 'time'))
+    layer = re.sub(r'[^A-Za-z0-9_]+', '_', query.get('layers', 'layer'))
+    return f"{layer}_{query.get('time') or 'latest'}_{hashlib.sha1(key.encode()).hexdigest()[:12]}.png".replace(':', '')
+
+
+class MockGeoServer:
+    """
+    Threaded HTTP server replaying the NOAA GeoServer endpoints.
+
+    latency_ms/jitter_ms delay every response, error_rate is the share of
+    requests answered with HTTP 500 and a ServiceException, and
+    timeout_rate the share that hang for hang_s seconds (longer than the
+    app's 20 s client timeout by default) before the connection is closed.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, timeout_rate=0.0, hang_s=25.0, record=False, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_s = hang_s
+        self.record = record
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._conus = load_capabilities(os.path.join(ROOT, 'capabilities.xml'))
+        self._station = load_capabilities(os.path.join(ROOT, 'kcle_capabilities.xml'))
+        self._synthetic = {}
+        self._synthetic_lock = threading.Lock()
+        self.requests = 0
+        self.counts = {}
+        self.served = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/geoserver'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-noaa', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def _roll(self):
+        with self._random_lock:
+            self.requests += 1
+            return self._random.random(), self._random.uniform(-1.0, 1.0)
+
+    def _count(self, request):
+        with self._random_lock:
+            self.counts[request] = self.counts.get(request, 0) + 1
+
+    def _served(self, kind):
+        with self._random_lock:
+            self.served[kind] = self.served.get(kind, 0) + 1
+
+    def capabilities(self, workspace):
+        if workspace == 'conus':
+            return self._conus
+        # Station workspaces share the KCLE document, renamed
+        return self._station.replace(b'kcle', workspace.lower().encode()).replace(b'KCLE', workspace.upper().encode())
+
+    def get_map(self, path, query):
+        name = recording_name(query)
+        recorded = os.path.join(RECORDINGS, name)
+        if self.record:
+            return self._record(path, query, recorded)
+        if os.path.exists(recorded):
+            self._served('recorded')
+            with open(recorded, 'rb') as f:
+                return f.read()
+        self._served('synthetic')
+        return self._synthesize(query)
+
+    def fixtures(self):
+        """Which GetMap fixtures were served: kind (synthetic, recorded, mixed or none) and counts"""
+        recorded = self.served.get('recorded', 0)
+        synthetic = self.served.get('synthetic', 0)
+        if recorded and synthetic:
+            kind = 'mixed'
+        elif recorded:
+            kind = 'recorded'
+        elif synthetic:
+            kind = 'synthetic'
+        else:
+            kind = 'none'
+        return {'kind': kind, 'recorded': recorded, 'synthetic': synthetic}
+
+    def _record(self, path, query, recorded):
+        import requests
+        resp = requests.get(NOAA_GEOSERVER + path[len('/geoserver'):], params=query, timeout=30,
+                            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'})
+        if resp.status_code == 200 and resp.content[:8] == b'\x89PNG\r\n\x1a\n':
+            os.makedirs(RECORDINGS, exist_ok=True)
+            with open(recorded, 'wb') as f:
+                f.write(resp.content)
+        return resp.content
+
+    def _synthesize(self, query):
+        """Deterministic synthetic frame; storms move east with the scan minute"""
+        width, height = int(query.get('width', 1400)), int(query.get('height', 1200))
+        scan = query.get('time', '')
+        minute = int(scan[14:16]) if len(scan) >= 16 else 0
+        base_key = (query.get('layers'), width, height)
+        key = base_key + (minute,)
+        with self._synthetic_lock:
+            content = self._synthetic.get(key)
+            base = self._synthetic.get(base_key)
+        if content is None:
+            if base is None:
+                seed = int(hashlib.sha1(str(query.get('layers')).encode()).hexdigest()[:8], 16)
+                base = render_rgba(width, height, seed=seed, shift=0)
+            out = BytesIO()
+            Image.fromarray(np.roll(base, minute * 2, axis=1)).save(out, 'PNG', compress_level=1)
+            content = out.getvalue()
+            with self._synthetic_lock:
+                self._synthetic[base_key] = base
+                self._synthetic[key] = content
+        return content
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'max-age=60')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                roll, jitter = mock._roll()
+                delay = max(mock.latency_ms + jitter * mock.jitter_ms, 0.0) / 1000.0
+                if roll < mock.timeout_rate:
+                    time.sleep(mock.hang_s)
+                    self.close_connection = True
+                    return
+                if delay:
+                    time.sleep(delay)
+                if roll < mock.timeout_rate + mock.error_rate:
+                    self._send(500, 'application/vnd.ogc.se_xml', SERVICE_EXCEPTION)
+                    return
+
+                url = urlparse(self.path)
+                parts = url.path.strip('/').split('/')
+                query = {k.lower(): v[0] for k, v in parse_qs(url.query).items()}
+                if len(parts) != 3 or parts[0] != 'geoserver' or parts[2] not in ('ows', 'wms'):
+                    self._send(404, 'text/plain', b'Not found')
+                    return
+                request = query.get('request', '').lower()
+                mock._count(request)
+                if request == 'getcapabilities':
+                    self._send(200, 'text/xml', mock.capabilities(parts[1]))
+                elif request == 'getmap':
+                    body = mock.get_map(url.path, query)
+                    if body[:8] == b'\x89PNG\r\n\x1a\n':
+                        self._send(200, 'image/png', body)
+                    else:
+                        self._send(502, 'application/vnd.ogc.se_xml', body or SERVICE_EXCEPTION)
+                else:
+                    self._send(400, 'application/vnd.ogc.se_xml', SERVICE_EXCEPTION)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--hang-s', type=float, default=25.0)
+    parser.add_argument('--record', action='store_true', help='proxy GetMap to NOAA and save the PNGs')
+    args = parser.parse_args()
+
+    mock = MockGeoServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate,
+                         args.timeout_rate, args.hang_s, args.record)
+    print(f'Mock GeoServer at {mock.url}', flush=True)
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
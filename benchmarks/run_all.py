@@ -0,0 +1,66 @@
+"""
+Benchmark suite
+Runs every benchmark script in its own process and collects their JSON
+reports into one document, so runs can be stored and diffed.
+
+    python benchmarks/run_all.py [--output report.json] [--skip http]
+
+Arguments after -- are passed to bench_http.py.  Exits non-zero when any
+benchmark fails (over budget, or a regression against --baseline).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCHMARKS = ['boot', 'cells', 'nowcast', 'zonal', 'http', 'startup']
+
+
+def run(name, extra_args):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(HERE, f'bench_{name}.py')] + extra_args,
+                          capture_output=True, text=True)
+    try:
+        report = json.loads(proc.stdout)
+    except ValueError:
+        report = {'error': (proc.stderr or proc.stdout)[-2000:]}
+    return {
+        'name': name,
+        'passed': proc.returncode == 0,
+        'seconds': round(time.perf_counter() - start, 1),
+        'report': report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--output')
+    parser.add_argument('--skip', default='', help='comma-separated benchmarks to leave out')
+    args, http_args = parser.parse_known_args()
+    if http_args[:1] == ['--']:
+        http_args = http_args[1:]
+    skip = set(filter(None, args.skip.split(',')))
+
+    results = [run(name, http_args if name == 'http' else []) for name in BENCHMARKS if name not in skip]
+    suite = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'passed': all(r['passed'] for r in results),
+        'benchmarks': results,
+    }
+    text = json.dumps(suite, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return 0 if suite['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Upstream request budget
+A token bucket per upstream host limits how fast this process calls NOAA.
+Requests carry a priority; lower priorities are only admitted while the
+bucket keeps a reserve for the ones above them, so under a spike history
+backfill is shed first, then prefetch, and the newest frame last.
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+import metrics
+
+# Request priorities, most important first
+FOREGROUND = 'foreground'
+PREFETCH = 'prefetch'
+BACKFILL = 'backfill'
+PRIORITIES = (FOREGROUND, PREFETCH, BACKFILL)
+
+# Share of the bucket that must remain after admitting a request of each priority
+RESERVE = {FOREGROUND: 0.0, PREFETCH: 0.25, BACKFILL: 0.5}
+
+# Smallest burst a bucket is given: below it the reserves leave no whole token
+# above them (PREFETCH needs burst > 1.33, BACKFILL > 2), so those priorities
+# would always be shed instead of only during spikes
+MIN_BURST = 4.0
+
+
+class UpstreamShed(Exception):
+    """Raised when the upstream budget refuses a request"""
+
+
+class TokenBucket:
+    """Classic token bucket: rate tokens per second, holding at most burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_take(self, floor=0.0):
+        """Take one token if at least floor tokens remain afterwards"""
+        with self._lock:
+            self._refill()
+            if self._tokens - 1.0 >= floor:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def wait_time(self, floor=0.0):
+        """Seconds until try_take(floor) can succeed"""
+        with self._lock:
+            self._refill()
+            missing = floor + 1.0 - self._tokens
+        return max(missing, 0.0) / self.rate if self.rate > 0 else float('inf')
+
+
+class UpstreamBudget:
+    """
+    Per-host token buckets with priority admission.
+
+    Foreground requests may wait up to foreground_wait seconds for a token;
+    the other priorities never wait, so an exhausted budget sheds them
+    immediately instead of queueing upstream calls.
+    """
+
+    def __init__(self, rate=20.0, burst=40.0, foreground_wait=0.25):
+        self.rate = rate
+        self.burst = max(float(burst), MIN_BURST)
+        self.foreground_wait = foreground_wait
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return bucket
+
+    def acquire(self, url, priority=FOREGROUND):
+        """Admit (True) or shed (False) one request to url's host"""
+        host = urlparse(url).netloc
+        bucket = self.bucket(host)
+        floor = RESERVE[priority] * self.burst
+        admitted = bucket.try_take(floor)
+        if not admitted and priority == FOREGROUND:
+            wait = bucket.wait_time(floor)
+            if wait <= self.foreground_wait:
+                time.sleep(wait)
+                admitted = bucket.try_take(floor)
+        if admitted:
+            metrics.UPSTREAM_ADMITTED.inc(host=host, priority=priority)
+        else:
+            metrics.UPSTREAM_SHED.inc(host=host, priority=priority)
+        return admitted
+
+    def utilization(self):
+        """{(host,): share of the bucket in use} for the metrics endpoint"""
+        with self._lock:
+            buckets = list(self._buckets.items())
+        return {(host,): 1.0 - bucket.tokens / bucket.burst for host, bucket in buckets}
@@ -0,0 +1,52 @@
+"""
+Multi-layer composites
+Stacks the frames of several products into one RGBA image: frames are
+resampled onto a common grid (see georef) and alpha-composited in order,
+the first layer at the bottom.
+"""
+import numpy as np
+
+import georef
+import metrics
+
+# Layers a single composite may stack
+MAX_COMPOSITE_LAYERS = 4
+
+
+def alpha_over(bottom, top):
+    """Porter-Duff "over" of two (H, W, 4) uint8 RGBA arrays"""
+    top_a = top[..., 3:4].astype(np.float32) / 255.0
+    bottom_a = bottom[..., 3:4].astype(np.float32) / 255.0
+    under = bottom_a * (1.0 - top_a)
+    alpha = top_a + under
+    rgb = top[..., :3] * top_a + bottom[..., :3] * under
+    np.divide(rgb, alpha, out=rgb, where=alpha > 0)
+    out = np.empty(top.shape, dtype=np.uint8)
+    out[..., :3] = np.clip(rgb + 0.5, 0, 255)
+    out[..., 3:] = np.clip(alpha * 255.0 + 0.5, 0, 255)
+    return out
+
+
+def resample_rgba(rgba, src, dst):
+    """Nearest-neighbour resample of an RGBA array from grid src onto dst (transparent outside src)"""
+    if src.key == dst.key:
+        return rgba
+    rows, cols, inside = georef.resample_index(src, dst)
+    out = rgba[rows][:, cols]
+    out[~inside] = 0
+    return out
+
+
+def composite_frames(frames):
+    """
+    Composite frames (bottom layer first) onto the finest of their grids.
+
+    Returns (rgba, grid).
+    """
+    grid = max((f.grid for f in frames), key=lambda g: g.width * g.height)
+    with metrics.span('composite'):
+        out = None
+        for frame in frames:
+            rgba = resample_rgba(frame.rgba, frame.grid, grid)
+            out = rgba if out is None else alpha_over(out, rgba)
+    return out, grid
@@ -0,0 +1,99 @@
+"""
+Streaming frame exports
+Turns an iterator of (metadata, PNG bytes) pairs into a tar, zip or NDJSON
+byte stream.  Each frame is written and handed to the response as soon as
+it is available, so memory stays bounded by a single frame no matter how
+many the export holds.  The metadata of every frame also goes into a
+manifest.ndjson member at the end of tar and zip exports.
+"""
+import base64
+import io
+import json
+import tarfile
+import time
+import zipfile
+
+EXPORT_FORMATS = {
+    'tar': 'application/x-tar',
+    'zip': 'application/zip',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Sink:
+    """Write-only file object collecting archive output between yields"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def manifest_line(meta):
+    return json.dumps(meta, separators=(',', ':')) + '\n'
+
+
+def stream_ndjson(frames):
+    """One JSON line per frame, PNG bytes base64-encoded under "png" (absent for missing frames)"""
+    for meta, content in frames:
+        line = dict(meta)
+        if content is not None:
+            line['png'] = base64.b64encode(content).decode('ascii')
+        yield manifest_line(line).encode()
+
+
+def stream_tar(frames):
+    """Uncompressed tar stream of the frames followed by manifest.ndjson"""
+    sink = _Sink()
+    manifest = []
+    with tarfile.open(fileobj=sink, mode='w|') as tar:
+        for meta, content in frames:
+            manifest.append(manifest_line(meta))
+            if content is not None:
+                info = tarfile.TarInfo(meta['name'])
+                info.size = len(content)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(content))
+            data = sink.drain()
+            if data:
+                yield data
+        body = ''.join(manifest).encode()
+        info = tarfile.TarInfo('manifest.ndjson')
+        info.size = len(body)
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(body))
+    yield sink.drain()
+
+
+def stream_zip(frames):
+    """Zip stream (stored, PNGs are already compressed) of the frames followed by manifest.ndjson"""
+    sink = _Sink()
+    manifest = []
+    # The sink cannot seek, so zipfile writes data descriptors after each member
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for meta, content in frames:
+            manifest.append(manifest_line(meta))
+            if content is not None:
+                archive.writestr(zipfile.ZipInfo(meta['name'], time.gmtime()[:6]), content)
+            data = sink.drain()
+            if data:
+                yield data
+        archive.writestr(zipfile.ZipInfo('manifest.ndjson', time.gmtime()[:6]), ''.join(manifest))
+    yield sink.drain()
+
+
+STREAMS = {
+    'tar': stream_tar,
+    'zip': stream_zip,
+    'ndjson': stream_ndjson,
+}
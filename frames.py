@@ -0,0 +1,437 @@
+"""
+Radar frame history
+Indexes the WMS capabilities time dimension and keeps recently fetched
+frames in memory, decoding them to arrays only when a consumer needs it.
+"""
+import contextvars
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from time import monotonic, perf_counter
+
+import numpy as np
+
+import georef
+import metrics
+from budget import BACKFILL, FOREGROUND, PREFETCH, UpstreamShed
+from palettes import decode_levels, level_values
+from weather_layers import WEATHER_LAYERS
+
+
+def parse_wms_time(value):
+    """Parse an ISO8601 WMS time value into an aware UTC datetime"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+
+def _local_tag(element):
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def parse_time_dimension(xml_bytes):
+    """
+    Extract the time dimension of every layer in a GetCapabilities document.
+
+    Handles both WMS 1.3.0 (values inside <Dimension>) and WMS 1.1.1
+    (values inside <Extent>).  Returns {layer_name: [time, ...]} with times
+    as the ISO strings advertised by the server, oldest first.
+    """
+    # Imported here: only capabilities refreshes parse XML
+    import xml.etree.ElementTree as ET
+    root = ET.fromstring(xml_bytes)
+    index = {}
+    for layer in root.iter():
+        if _local_tag(layer) != 'Layer':
+            continue
+        name = None
+        values = None
+        for child in layer:
+            tag = _local_tag(child)
+            if tag == 'Name':
+                name = (child.text or '').strip()
+            elif tag in ('Dimension', 'Extent') and child.get('name') == 'time' and (child.text or '').strip():
+                values = child.text.strip()
+        if not name or not values:
+            continue
+        # Interval notation (start/end/period) is not used by the NOAA services
+        times = [v.strip() for v in values.split(',') if v.strip() and '/' not in v]
+        times.sort(key=parse_wms_time)
+        index[name] = times
+    return index
+
+
+class Frame:
+    """A single fetched radar image plus the grid it was requested on"""
+
+    __slots__ = ('station', 'layer_id', 'time', '_content', 'url', 'source',
+                 'grid', 'fetched_at', '_levels')
+
+    def __init__(self, station, layer_id, time, content, url, source=None):
+        self.station = station
+        self.layer_id = layer_id
+        self.time = time
+        # bytes, or a memoryview into a mapped snapshot until first use
+        self._content = content
+        self.url = url
+        self.source = source
+        self.grid = georef.grid_from_url(url)
+        self.fetched_at = datetime.now(timezone.utc)
+        self._levels = None
+
+    @property
+    def key(self):
+        return (self.station, self.layer_id, self.time)
+
+    @property
+    def content(self):
+        """PNG bytes of the frame"""
+        content = self._content
+        if not isinstance(content, bytes):
+            content = self._content = bytes(content)
+        return content
+
+    @property
+    def content_view(self):
+        """PNG bytes without copying a mapped snapshot into the heap (bytes or memoryview)"""
+        return self._content
+
+    @property
+    def scan_time(self):
+        """Scan time as a UTC datetime (fetch time when the frame is untimed)"""
+        return parse_wms_time(self.time) if self.time else self.fetched_at
+
+    @property
+    def bbox(self):
+        return self.grid.bbox
+
+    @property
+    def width(self):
+        return self.grid.width
+
+    @property
+    def height(self):
+        return self.grid.height
+
+    @property
+    def palette(self):
+        # The CONUS fallback always serves base reflectivity
+        if self.source == 'conus_bref':
+            return 'reflectivity'
+        return WEATHER_LAYERS.get(self.layer_id, {}).get('palette')
+
+    @property
+    def rgba(self):
+        """Decoded image as a (height, width, 4) uint8 array (not cached)"""
+        from PIL import Image
+        with metrics.span('png_decode'), Image.open(BytesIO(self.content)) as image:
+            return np.asarray(image.convert('RGBA'))
+
+    @property
+    def decoded(self):
+        return self._levels is not None
+
+    @property
+    def levels(self):
+        """Legend level of every pixel (uint8, NO_DATA = none), or None if the layer has no palette"""
+        levels = self._levels
+        if levels is None and self.palette:
+            rgba = self.rgba
+            with metrics.span('palette_decode'):
+                levels = self._levels = decode_levels(rgba, self.palette)
+        return levels
+
+    @property
+    def values(self):
+        """Palette-decoded physical values (NaN = no data), or None if the layer has no palette"""
+        levels = self.levels
+        return None if levels is None else level_values(self.palette)[levels]
+
+    def values_at(self, x, y):
+        """Physical values at pixel arrays x, y (NaN = no data)"""
+        levels = self.levels
+        if levels is None:
+            return None
+        return level_values(self.palette)[levels[y, x]]
+
+    def release(self):
+        """Drop the decoded levels; they are rebuilt from the PNG on demand"""
+        self._levels = None
+
+    def restore_levels(self, levels):
+        """Adopt previously decoded levels (e.g. a memory-mapped snapshot array)"""
+        self._levels = levels
+
+
+class CapabilitiesIndex:
+    """
+    Per-workspace cache of layer time dimensions with a short TTL.
+
+    Documents are downloaded through fetch(workspace, priority), which
+    raises UpstreamShed when the upstream budget refuses it.  One refresh
+    per workspace is in flight at a time: while it runs, callers holding a
+    stale index are answered from it and only first-time callers wait.
+    A refresh with a stale index to fall back on runs at PREFETCH
+    priority, so it is shed before frame fetches.
+    """
+
+    def __init__(self, fetch, ttl=120):
+        self._fetch = fetch
+        self._ttl = ttl
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def layers(self, workspace):
+        with self._lock:
+            entry = self._entries.get(workspace)
+            fresh = entry is not None and monotonic() - entry[0] < self._ttl
+            pending = None
+            if not fresh:
+                pending = self._pending.get(workspace)
+                owner = pending is None
+                if owner:
+                    pending = self._pending[workspace] = Future()
+        metrics.cache_result('capabilities', fresh)
+        if fresh:
+            return entry[1]
+        if not owner:
+            # Another request is refreshing this workspace
+            return entry[1] if entry else pending.result()
+
+        index = None
+        try:
+            index = self._refresh(workspace, PREFETCH if entry else FOREGROUND)
+        finally:
+            # Keep serving a stale index rather than nothing
+            result = index if index is not None else (entry[1] if entry else {})
+            with self._lock:
+                self._pending.pop(workspace, None)
+            pending.set_result(result)
+        return result
+
+    def _refresh(self, workspace, priority):
+        """Download and parse a workspace's capabilities; None when shed or failed"""
+        try:
+            xml_bytes = self._fetch(workspace, priority)
+        except UpstreamShed:
+            return None
+        if not xml_bytes:
+            return None
+        try:
+            index = parse_time_dimension(xml_bytes)
+        except SyntaxError:  # xml.etree.ElementTree.ParseError
+            return None
+        with self._lock:
+            self._entries[workspace] = (monotonic(), index)
+        return index
+
+    def export(self):
+        """{workspace: (age in seconds, index)} for snapshots"""
+        now = monotonic()
+        with self._lock:
+            return {ws: (now - stamp, index) for ws, (stamp, index) in self._entries.items()}
+
+    def restore(self, entries):
+        """Load exported entries, keeping their age; newer entries already held win"""
+        now = monotonic()
+        with self._lock:
+            for workspace, (age, index) in entries.items():
+                if workspace not in self._entries:
+                    self._entries[workspace] = (now - age, index)
+
+    def times(self, workspace, layer_name):
+        """Advertised times for a layer, oldest first"""
+        layers = self.layers(workspace)
+        # Capabilities list names without the workspace prefix
+        return layers.get(layer_name) or layers.get(layer_name.split(':', 1)[-1], [])
+
+
+class FrameStore:
+    """
+    Bounded in-memory store of frames keyed by (station, layer_id, time).
+
+    Missing frames are fetched through the supplied callable,
+    fetch(layer_id, station, time, priority) -> (content, url, source), on
+    a small worker pool.  Concurrent requests for the same frame share one
+    fetch.  fetch raises budget.UpstreamShed when the upstream budget
+    refuses it; the frame is then simply not loaded.
+    PNG bytes are kept for every frame but decoded levels only for the
+    max_decoded most recently used ones.  on_load, if given, is called with
+    every timed frame fetched from upstream.
+    """
+
+    def __init__(self, fetch, max_frames=240, max_decoded=48, workers=4, on_load=None):
+        self._fetch = fetch
+        self._on_load = on_load
+        self._max_frames = max_frames
+        self._max_decoded = max_decoded
+        self._frames = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='frame-fetch')
+
+    def get(self, station, layer_id, time):
+        """Return a cached frame without fetching"""
+        key = (station, layer_id, time)
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, frame):
+        with self._lock:
+            self._frames[frame.key] = frame
+            self._frames.move_to_end(frame.key)
+            while len(self._frames) > self._max_frames:
+                self._frames.popitem(last=False)
+            self._trim_decoded()
+
+    def _trim_decoded(self):
+        """Release decoded levels beyond max_decoded, least recently used first (lock held)"""
+        decoded = [f for f in self._frames.values() if f.decoded]
+        for frame in decoded[:max(len(decoded) - self._max_decoded, 0)]:
+            frame.release()
+
+    def snapshot(self):
+        """Frames held, least recently used first"""
+        with self._lock:
+            return list(self._frames.values())
+
+    def restore(self, frames):
+        """Add frames (least recently used first) without displacing frames already held"""
+        with self._lock:
+            # Restored frames are older than anything fetched since boot
+            for frame in reversed(frames):
+                if frame.key not in self._frames:
+                    self._frames[frame.key] = frame
+                    self._frames.move_to_end(frame.key, last=False)
+            while len(self._frames) > self._max_frames:
+                self._frames.popitem(last=False)
+            self._trim_decoded()
+
+    def sizes(self):
+        """(frames held, frames with decoded levels)"""
+        with self._lock:
+            return len(self._frames), sum(1 for f in self._frames.values() if f.decoded)
+
+    def frames(self, station, layer_id):
+        """Cached frames for a station/layer, oldest first"""
+        with self._lock:
+            found = [f for (s, l, _), f in self._frames.items() if s == station and l == layer_id]
+        return sorted(found, key=lambda f: f.scan_time)
+
+    def touch(self, frames):
+        """Mark frames as recently used and enforce the decoded budget"""
+        with self._lock:
+            for frame in frames:
+                if frame.key in self._frames:
+                    self._frames.move_to_end(frame.key)
+            self._trim_decoded()
+
+    def _load(self, station, layer_id, time, priority):
+        content, url, source = self._fetch(layer_id, station, time, priority)
+        if not content:
+            return None
+        frame = Frame(station, layer_id, time, content, url, source)
+        # Untimed frames are a "latest" snapshot, not part of the history
+        if time is not None:
+            self.put(frame)
+            if self._on_load is not None:
+                self._on_load(frame)
+        return frame
+
+    def _queued_load(self, submitted, station, layer_id, time, priority):
+        """_load on a worker, recording queue wait and worker occupancy"""
+        metrics.QUEUE_WAIT_SECONDS.observe(perf_counter() - submitted)
+        metrics.FETCH_QUEUE_DEPTH.dec()
+        metrics.FETCH_WORKERS_BUSY.inc()
+        try:
+            return self._load(station, layer_id, time, priority)
+        finally:
+            metrics.FETCH_WORKERS_BUSY.dec()
+
+    def _submit(self, station, layer_id, time, priority=FOREGROUND):
+        key = (station, layer_id, time)
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                future = self._pending.get(key)
+                created = future is None
+                if created:
+                    metrics.FETCH_QUEUE_DEPTH.inc()
+                    # Run in the caller's context so its request spans include the fetch
+                    future = self._pool.submit(contextvars.copy_context().run, self._queued_load,
+                                               perf_counter(), station, layer_id, time, priority)
+                    self._pending[key] = future
+        metrics.cache_result('frames', frame is not None)
+        if frame is not None:
+            done = Future()
+            done.set_result(frame)
+            return done
+        if created:
+            future.add_done_callback(lambda _f: self._forget(key))
+        return future
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def load(self, station, layer_id, time, priority=FOREGROUND):
+        """Return the frame, fetching it if it is not cached; raises UpstreamShed when shed"""
+        try:
+            return self._submit(station, layer_id, time, priority).result()
+        except UpstreamShed:
+            raise
+        except Exception:
+            return None
+
+    def submit(self, station, layer_id, time, priority=BACKFILL):
+        """Future of a frame (None when unavailable), fetched on the pool unless cached"""
+        return self._submit(station, layer_id, time, priority)
+
+    def load_layers(self, station, layer_times, priority=FOREGROUND):
+        """
+        Fetch one frame of each of several layers in parallel.
+
+        layer_times is [(layer_id, time), ...]; returns the frames in the
+        same order (None where nothing was found).  Raises UpstreamShed
+        when any of them was shed.
+        """
+        futures = [self._submit(station, layer_id, t, priority) for layer_id, t in layer_times]
+        frames = []
+        shed = None
+        for future in futures:
+            try:
+                frames.append(future.result())
+            except UpstreamShed as e:
+                shed = e
+            except Exception:
+                frames.append(None)
+        if shed is not None:
+            raise shed
+        self.touch([f for f in frames if f is not None])
+        return frames
+
+    def load_many(self, station, layer_id, times, priority=BACKFILL, latest_priority=None):
+        """
+        Fetch any missing frames in parallel; returns the frames found, oldest first.
+
+        times are oldest first; the last one is fetched at latest_priority
+        when given.  Shed frames are left out of the result.
+        """
+        futures = [self._submit(station, layer_id, t,
+                                latest_priority if latest_priority and i == len(times) - 1 else priority)
+                   for i, t in enumerate(times)]
+        frames = []
+        for future in futures:
+            try:
+                frame = future.result()
+            except Exception:
+                frame = None
+            if frame is not None:
+                frames.append(frame)
+        self.touch(frames)
+        return sorted(frames, key=lambda f: f.scan_time)
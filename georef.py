@@ -0,0 +1,179 @@
+"""
+Georeferencing of WMS request grids
+A GetMap request covers a bbox in some CRS at a given image size.  Grid
+holds the affine transform between pixels and CRS coordinates, the
+projection between CRS coordinates and lat/lon, and per-row/per-column
+lookup tables, built once per (bbox, size, CRS) and shared by every frame,
+endpoint and analysis on that grid.
+"""
+from functools import lru_cache
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+KM_PER_DEG = 111.32
+
+# Spherical Mercator radius (EPSG:3857)
+EARTH_RADIUS_M = 6378137.0
+
+
+def _identity(a, b):
+    return a, b
+
+
+def _mercator_forward(lon, lat):
+    x = np.radians(lon) * EARTH_RADIUS_M
+    y = np.log(np.tan(np.pi / 4.0 + np.radians(lat) / 2.0)) * EARTH_RADIUS_M
+    return x, y
+
+
+def _mercator_inverse(x, y):
+    lon = np.degrees(x / EARTH_RADIUS_M)
+    lat = np.degrees(2.0 * np.arctan(np.exp(y / EARTH_RADIUS_M)) - np.pi / 2.0)
+    return lon, lat
+
+
+# CRS -> (lon/lat -> x/y, x/y -> lon/lat).  All of them are cylindrical, so
+# x depends only on lon and y only on lat.
+PROJECTIONS = {
+    'EPSG:4326': (_identity, _identity),
+    'CRS:84': (_identity, _identity),
+    'EPSG:3857': (_mercator_forward, _mercator_inverse),
+    'EPSG:900913': (_mercator_forward, _mercator_inverse),
+}
+
+
+class Grid:
+    """
+    Pixel grid of one GetMap request.
+
+    bbox is (x_min, y_min, x_max, y_max) in the CRS, x east and y north
+    (lon/lat for EPSG:4326).  Pixel (col, row) has its top-left corner at
+    x_min + col * dx, y_max - row * dy; centres are at +0.5.
+    """
+
+    def __init__(self, bbox, width, height, crs='EPSG:4326'):
+        crs = crs.upper()
+        if crs not in PROJECTIONS:
+            raise ValueError(f'Unsupported CRS {crs}')
+        self.bbox = tuple(float(v) for v in bbox)
+        self.width = int(width)
+        self.height = int(height)
+        self.crs = crs
+        self._forward, self._inverse = PROJECTIONS[crs]
+
+        x_min, y_min, x_max, y_max = self.bbox
+        self.dx = (x_max - x_min) / self.width
+        self.dy = (y_max - y_min) / self.height
+        # GDAL-style geotransform: x = c + a * col, y = f + e * row
+        self.transform = (x_min, self.dx, 0.0, y_max, 0.0, -self.dy)
+
+        # Lat/lon of every pixel centre (column -> lon, row -> lat) and edge
+        self.lon_centers, _ = self._inverse(x_min + (np.arange(self.width) + 0.5) * self.dx, 0.0)
+        _, self.lat_centers = self._inverse(0.0, y_max - (np.arange(self.height) + 0.5) * self.dy)
+        _, lat_edges = self._inverse(0.0, y_max - np.arange(self.height + 1) * self.dy)
+        lon_edges, _ = self._inverse(x_min + np.arange(self.width + 1) * self.dx, 0.0)
+        self.lon_edges = np.asarray(lon_edges, dtype=np.float64)
+        self.lat_edges = np.asarray(lat_edges, dtype=np.float64)
+
+        # Area of one pixel in each row
+        deg_x = np.diff(self.lon_edges).mean()
+        deg_y = -np.diff(self.lat_edges)
+        self.row_area_km2 = (deg_y * KM_PER_DEG) * (deg_x * KM_PER_DEG * np.cos(np.radians(self.lat_centers)))
+
+    @property
+    def key(self):
+        return (self.bbox, self.width, self.height, self.crs)
+
+    @property
+    def bounds(self):
+        """(lon_min, lat_min, lon_max, lat_max) covered by the grid"""
+        return (float(self.lon_edges[0]), float(self.lat_edges[-1]),
+                float(self.lon_edges[-1]), float(self.lat_edges[0]))
+
+    def to_pixel(self, lats, lons):
+        """Vectorized lat/lon -> continuous pixel coordinates (x right, y down)"""
+        x, y = self._forward(np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+        x_min, _, _, y_max = self.bbox
+        return (x - x_min) / self.dx, (y_max - y) / self.dy
+
+    def to_lonlat(self, x, y):
+        """Vectorized continuous pixel coordinates -> (lon, lat)"""
+        x_min, _, _, y_max = self.bbox
+        return self._inverse(x_min + np.asarray(x, dtype=np.float64) * self.dx,
+                             y_max - np.asarray(y, dtype=np.float64) * self.dy)
+
+    def pixels(self, lats, lons):
+        """Vectorized lat/lon -> integer (x, y, inside) arrays"""
+        fx, fy = self.to_pixel(np.atleast_1d(lats), np.atleast_1d(lons))
+        x = np.floor(fx).astype(np.int64)
+        y = np.floor(fy).astype(np.int64)
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        return x, y, inside
+
+    def pixel(self, lat, lon):
+        """(x, y) of a point, or None outside the grid"""
+        x, y, inside = self.pixels(lat, lon)
+        return (int(x[0]), int(y[0])) if inside[0] else None
+
+    def wms_params(self, version='1.1.1'):
+        """size, CRS and bbox parameters of a GetMap request on this grid"""
+        x_min, y_min, x_max, y_max = self.bbox
+        if version == '1.3.0':
+            # WMS 1.3.0 uses lat,lon axis order for EPSG:4326
+            if self.crs == 'EPSG:4326':
+                x_min, y_min, x_max, y_max = y_min, x_min, y_max, x_max
+            crs = {'crs': self.crs}
+        else:
+            crs = {'srs': self.crs}
+        return {'width': str(self.width), 'height': str(self.height), **crs,
+                'bbox': f'{x_min},{y_min},{x_max},{y_max}'}
+
+    def describe(self):
+        """JSON-friendly description for the debug endpoint and clients"""
+        lon_min, lat_min, lon_max, lat_max = self.bounds
+        return {
+            'crs': self.crs,
+            'width': self.width,
+            'height': self.height,
+            'bbox': list(self.bbox),
+            'bounds': {'lon_min': lon_min, 'lat_min': lat_min, 'lon_max': lon_max, 'lat_max': lat_max},
+            'transform': list(self.transform),
+        }
+
+
+@lru_cache(maxsize=64)
+def grid(bbox, width, height, crs='EPSG:4326'):
+    """Shared Grid for a (bbox, size, CRS)"""
+    return Grid(bbox, width, height, crs)
+
+
+def parse_getmap(url):
+    """Return ((x_min, y_min, x_max, y_max), width, height, crs) from a GetMap URL"""
+    query = {k.lower(): v[0] for k, v in parse_qs(urlparse(url).query).items()}
+    coords = tuple(float(c) for c in query['bbox'].split(','))
+    crs = (query.get('crs') or query.get('srs') or 'EPSG:4326').upper()
+    if query.get('version') == '1.3.0' and crs == 'EPSG:4326':
+        lat_min, lon_min, lat_max, lon_max = coords
+        coords = (lon_min, lat_min, lon_max, lat_max)
+    return coords, int(query['width']), int(query['height']), crs
+
+
+def grid_from_url(url):
+    """Shared Grid of a GetMap URL"""
+    return grid(*parse_getmap(url))
+
+
+@lru_cache(maxsize=32)
+def resample_index(src, dst):
+    """
+    Nearest-neighbour lookup from dst pixels into src: (rows, cols, inside).
+
+    The projections are cylindrical, so the lookup is separable: rows[j]
+    is the src row under dst row j and cols[i] the src column under dst
+    column i.  inside flags dst pixels that fall on src.
+    """
+    _, rows, row_inside = src.pixels(dst.lat_centers, np.full(dst.height, src.lon_centers[0]))
+    cols, _, col_inside = src.pixels(np.full(dst.width, src.lat_centers[0]), dst.lon_centers)
+    inside = row_inside[:, None] & col_inside[None, :]
+    return np.clip(rows, 0, src.height - 1), np.clip(cols, 0, src.width - 1), inside
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings
+The app is imported once in the master and workers are forked from it, so
+the interpreter, Flask, NumPy, the station table and any restored
+snapshot are shared copy-on-write instead of loaded by every worker.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+preload_app = True
+# Also read by the app, which splits the upstream budget between workers
+os.environ.setdefault('WEB_CONCURRENCY', '2')
+workers = int(os.environ['WEB_CONCURRENCY'])
+# Also read by the app for its worker saturation gauge
+threads = int(os.environ.get('WORKER_THREADS', 1))
+
+
+def when_ready(server):
+    """Finish loading in the master, then freeze it before the first fork"""
+    # Stacks the app imports lazily, so single-process runs start faster
+    import xml.etree.ElementTree  # noqa: F401
+    from PIL import Image, PngImagePlugin  # noqa: F401
+    # Keep the collector from writing to (and so copying) shared objects
+    gc.freeze()
@@ -0,0 +1,302 @@
+"""
+Metrics, spans and a sampling profiler for the radar pipeline
+Small, dependency-free implementations of Prometheus counters, gauges
+and histograms (text exposition format), per-request timing spans and a
+stack-sampling profiler that can be switched on while the app runs.
+
+Metrics are kept per process; under gunicorn each worker reports its own.
+"""
+import contextvars
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        super().__init__(name, documentation, labels)
+        # Optional callable evaluated at scrape time; labelled gauges return
+        # {label values tuple: value}
+        self._function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        if self._function is not None and not self.label_names:
+            return self._function()
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        if self._function is not None:
+            value = self._function()
+            if self.label_names:
+                with self._lock:
+                    self._values = {tuple(str(part) for part in key): v for key, v in value.items()}
+            else:
+                self.set(value)
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels):
+        """(bucket counts, sum, count) for one label set"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (list(state[0]), state[1], state[2]) if state else ([0] * len(self.buckets), 0.0, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+            labels = _format_labels(self.label_names, key, [('le', '+Inf')])
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {count}')
+        return lines
+
+
+def render_metrics():
+    """All registered metrics in Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Pipeline metrics shared by the app and its helper modules
+UPSTREAM_SECONDS = Histogram(
+    'radar_upstream_request_seconds', 'Upstream NOAA request latency by fallback candidate',
+    labels=('candidate', 'outcome'))
+UPSTREAM_BYTES = Counter(
+    'radar_upstream_bytes_total', 'Bytes received from NOAA by fallback candidate', labels=('candidate',))
+CACHE_REQUESTS = Counter(
+    'radar_cache_requests_total', 'Cache lookups by cache and result (hit/miss)', labels=('cache', 'result'))
+STAGE_SECONDS = Histogram(
+    'radar_stage_seconds', 'Time spent in pipeline stages (decode, encode, analysis)', labels=('stage',))
+QUEUE_WAIT_SECONDS = Histogram(
+    'radar_fetch_queue_wait_seconds', 'Time frame fetches wait for a worker')
+FETCH_WORKERS_BUSY = Gauge(
+    'radar_fetch_workers_busy', 'Frame fetch workers currently running')
+FETCH_QUEUE_DEPTH = Gauge(
+    'radar_fetch_queue_depth', 'Frame fetches waiting for a worker')
+UPSTREAM_ADMITTED = Counter(
+    'radar_upstream_admitted_total', 'Upstream requests admitted by the budget', labels=('host', 'priority'))
+UPSTREAM_SHED = Counter(
+    'radar_upstream_shed_total', 'Upstream requests refused by the budget', labels=('host', 'priority'))
+STALE_RESPONSES = Counter(
+    'radar_stale_responses_total', 'Responses served from cache because upstream calls were shed',
+    labels=('route',))
+HTTP_SECONDS = Histogram(
+    'radar_http_request_seconds', 'Request latency by route', labels=('route', 'method', 'status'))
+HTTP_RESPONSE_BYTES = Counter(
+    'radar_http_response_bytes_total', 'Response bytes sent by route', labels=('route',))
+ARCHIVE_FRAMES = Counter(
+    'radar_archive_frames_total',
+    'Frames offered to the archive by result (written/deduplicated/duplicate/dropped/error)', labels=('result',))
+HTTP_IN_FLIGHT = Gauge(
+    'radar_http_requests_in_flight', 'Requests currently being handled')
+
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+# Spans recorded during the current request (None outside a request)
+_request_spans = contextvars.ContextVar('radar_request_spans', default=None)
+
+
+def start_request_spans():
+    """Begin collecting spans for the current request"""
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def record_span(stage, seconds, **labels):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        entry = {'stage': stage, 'ms': round(seconds * 1000.0, 2)}
+        entry.update(labels)
+        spans.append(entry)
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time a block as a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start, **labels)
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the stacks of all threads.
+
+    Samples are aggregated as collapsed stacks ("a;b;c count"), the input
+    format of flamegraph tools.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._samples = _Tally()
+        self.interval = 0.01
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.01):
+        with self._lock:
+            if self.running:
+                return False
+            self.interval = max(float(interval), 0.001)
+            self._samples = _Tally()
+            self._stop.clear()
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return False
+            self._stop.set()
+            thread = self._thread
+        thread.join(timeout=5)
+        return True
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                    frame = frame.f_back
+                with self._lock:
+                    self._samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self, limit=None):
+        """Collapsed stacks, most sampled first"""
+        with self._lock:
+            items = self._samples.most_common(limit)
+        return '\n'.join(f'{stack} {count}' for stack, count in items) + ('\n' if items else '')
+
+    def status(self):
+        with self._lock:
+            total = sum(self._samples.values())
+        return {
+            'running': self.running,
+            'interval_ms': round(self.interval * 1000.0, 3),
+            'started_at': self.started_at,
+            'samples': total,
+        }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,187 @@
+"""
+Extrapolation nowcast
+Estimates a coarse motion field from the last few frames with tiled phase
+correlation and advects the latest frame forward along it.  Work is a
+fixed number of whole-array operations per frame, so the cost per station
+is bounded by the frame size alone.
+"""
+from io import BytesIO
+
+import numpy as np
+
+import metrics
+
+# Lead times served as extra frames
+NOWCAST_LEADS = (10, 20, 30)
+
+# Frames used to estimate motion (newest last)
+MOTION_FRAMES = 3
+
+# Frames are reduced by this factor before motion estimation
+DOWNSAMPLE = 4
+
+# Side of a phase-correlation tile, in reduced pixels
+TILE = 64
+
+# Tiles with less echo coverage than this are filled from their neighbours
+MIN_TILE_COVERAGE = 0.02
+
+# Budget for computing all lead times of one station, checked by the benchmarks
+NOWCAST_BUDGET_MS = 1500.0
+
+
+def reduce_mean(intensity, factor=DOWNSAMPLE):
+    """Block-average a 2D array by factor (cropping any remainder)"""
+    h, w = intensity.shape
+    intensity = intensity[:h - h % factor, :w - w % factor].astype(np.float32)
+    cols = sum(intensity[:, k::factor] for k in range(factor))
+    return sum(cols[k::factor] for k in range(factor)) / float(factor * factor)
+
+
+def _tiles(image, tile=TILE):
+    """Split a 2D array into (rows, cols, tile, tile) tiles, cropping the remainder"""
+    h, w = image.shape
+    ty, tx = h // tile, w // tile
+    return image[:ty * tile, :tx * tile].reshape(ty, tile, tx, tile).swapaxes(1, 2)
+
+
+def tile_shifts(previous, current, tile=TILE):
+    """
+    Per-tile displacement from previous to current by phase correlation.
+
+    Returns (dy, dx, coverage) arrays of shape (rows, cols), displacements
+    in reduced pixels.
+    """
+    a = _tiles(previous, tile)
+    b = _tiles(current, tile)
+    window = np.outer(np.hanning(tile), np.hanning(tile)).astype(np.float32)
+    fa = np.fft.rfft2(a * window)
+    fb = np.fft.rfft2(b * window)
+    cross = fb * np.conj(fa)
+    cross /= np.abs(cross) + 1e-9
+    corr = np.fft.irfft2(cross, s=(tile, tile))
+
+    peak = corr.reshape(corr.shape[0], corr.shape[1], -1).argmax(axis=2)
+    dy, dx = np.divmod(peak, tile)
+    # Wrap to signed shifts
+    dy = np.where(dy >= tile // 2, dy - tile, dy).astype(np.float32)
+    dx = np.where(dx >= tile // 2, dx - tile, dx).astype(np.float32)
+    coverage = np.minimum((a > 0).mean(axis=(2, 3)), (b > 0).mean(axis=(2, 3)))
+    return dy, dx, coverage
+
+
+def _fill_and_smooth(field, valid):
+    """Replace invalid tiles with the median of valid ones, then 3x3 box-smooth"""
+    if valid.any():
+        field = np.where(valid, field, np.median(field[valid]))
+    else:
+        field = np.zeros_like(field)
+    padded = np.pad(field, 1, mode='edge')
+    rows, cols = field.shape
+    total = sum(padded[i:i + rows, j:j + cols] for i in range(3) for j in range(3))
+    return total / 9.0
+
+
+def estimate_motion(history, factor=DOWNSAMPLE, tile=TILE):
+    """
+    Estimate a tile-resolution motion field.
+
+    history is a list of (scan_time, intensity) oldest first, where
+    intensity is a 2D array (0 = no echo) on one common grid.  Returns
+    (vy, vx) arrays in full-resolution pixels per minute, or None when
+    fewer than two frames are usable.
+    """
+    if len(history) < 2:
+        return None
+    reduced = [(t, reduce_mean(i, factor)) for t, i in history]
+    sum_y = sum_x = weight = 0.0
+    for (t0, a), (t1, b) in zip(reduced, reduced[1:]):
+        minutes = (t1 - t0).total_seconds() / 60.0
+        if minutes <= 0:
+            continue
+        dy, dx, coverage = tile_shifts(a, b, tile)
+        ok = coverage >= MIN_TILE_COVERAGE
+        sum_y = sum_y + np.where(ok, dy / minutes, 0.0)
+        sum_x = sum_x + np.where(ok, dx / minutes, 0.0)
+        weight = weight + ok
+    if np.isscalar(weight):
+        return None
+    valid = weight > 0
+    vy = _fill_and_smooth(np.divide(sum_y, weight, where=valid, out=np.zeros_like(sum_y)), valid)
+    vx = _fill_and_smooth(np.divide(sum_x, weight, where=valid, out=np.zeros_like(sum_x)), valid)
+    return vy * factor, vx * factor
+
+
+def _upsample(field, shape, cell):
+    """Bilinearly interpolate a tile-centred field to a full-resolution grid"""
+    rows, cols = field.shape
+    height, width = shape
+
+    def weights(size, count):
+        pos = np.clip((np.arange(size, dtype=np.float32) + 0.5) / cell - 0.5, 0, count - 1)
+        lo = np.minimum(pos.astype(np.int32), max(count - 2, 0))
+        hi = np.minimum(lo + 1, count - 1)
+        return lo, hi, (pos - lo).astype(np.float32)
+
+    x0, x1, wx = weights(width, cols)
+    y0, y1, wy = weights(height, rows)
+    # Separable: interpolate along x on the tile rows, then along y
+    field = field.astype(np.float32)
+    along_x = field[:, x0] * (1 - wx) + field[:, x1] * wx
+    return along_x[y0] * (1 - wy)[:, None] + along_x[y1] * wy[:, None]
+
+
+def upsample_motion(motion, shape, factor=DOWNSAMPLE, tile=TILE):
+    """Full-resolution (vy, vx) flow for a frame of the given (height, width)"""
+    vy, vx = motion
+    cell = tile * factor
+    return _upsample(vy, shape, cell), _upsample(vx, shape, cell)
+
+
+def advect(rgba, flow, lead_minutes):
+    """
+    Move an RGBA frame forward lead_minutes along a full-resolution flow.
+
+    Semi-Lagrangian: each output pixel takes the colour found upstream of
+    it, so legend colours are preserved exactly.  Pixels advected in from
+    outside the frame are transparent.
+    """
+    height, width = rgba.shape[:2]
+    vy, vx = flow
+    src_y = np.rint(vy * -lead_minutes).astype(np.int32)
+    src_y += np.arange(height, dtype=np.int32)[:, None]
+    src_x = np.rint(vx * -lead_minutes).astype(np.int32)
+    src_x += np.arange(width, dtype=np.int32)[None, :]
+    inside = (src_y >= 0) & (src_y < height) & (src_x >= 0) & (src_x < width)
+    np.clip(src_y, 0, height - 1, out=src_y)
+    np.clip(src_x, 0, width - 1, out=src_x)
+    # Gather whole pixels through a uint32 view of the RGBA data
+    packed = np.ascontiguousarray(rgba).view('<u4')[..., 0].ravel()
+    src_y *= width
+    src_y += src_x
+    out = packed.take(src_y)
+    out[~inside] = 0
+    return out.view(np.uint8).reshape(height, width, 4)
+
+
+def encode_png(rgba):
+    """Encode an RGBA array as PNG (fast compression; these frames are short-lived)"""
+    from PIL import Image
+    out = BytesIO()
+    with metrics.span('png_encode'):
+        Image.fromarray(rgba, 'RGBA').save(out, 'PNG', compress_level=1)
+    return out.getvalue()
+
+
+def nowcast_frames(history, latest_rgba, leads=NOWCAST_LEADS):
+    """
+    Build extrapolated PNG frames for each lead time.
+
+    history is as for estimate_motion; latest_rgba is the newest frame.
+    Returns ({lead: png_bytes}, motion) or (None, None) without motion.
+    """
+    motion = estimate_motion(history)
+    if motion is None:
+        return None, None
+    flow = upsample_motion(motion, latest_rgba.shape[:2])
+    return {lead: encode_png(advect(latest_rgba, flow, lead)) for lead in leads}, motion
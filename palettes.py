@@ -0,0 +1,169 @@
+# Color palettes used by the NOAA GeoServer radar styles
+#
+# Each palette maps a legend color to the physical value at the bottom of
+# that color band, and carries the units and a default "significant"
+# threshold for area statistics.  The tables follow the standard NWS color scales; the
+# GeoServer styles are close to, but not exactly, these values so pixels
+# are matched to the nearest legend color.
+import numpy as np
+
+PALETTES = {
+    # Reflectivity in dBZ
+    'reflectivity': {
+        'units': 'dBZ',
+        'threshold': 40,
+        'colors': [
+            (5, (4, 233, 231)),
+            (10, (1, 159, 244)),
+            (15, (3, 0, 244)),
+            (20, (2, 253, 2)),
+            (25, (1, 197, 1)),
+            (30, (0, 142, 0)),
+            (35, (253, 248, 2)),
+            (40, (229, 188, 0)),
+            (45, (253, 149, 0)),
+            (50, (253, 0, 0)),
+            (55, (212, 0, 0)),
+            (60, (188, 0, 0)),
+            (65, (248, 0, 253)),
+            (70, (152, 84, 198)),
+            (75, (253, 253, 253)),
+        ],
+    },
+    # Radial velocity in knots (negative = toward the radar)
+    'velocity': {
+        'units': 'kt',
+        'threshold': 50,
+        'colors': [
+            (-64, (2, 252, 2)),
+            (-50, (1, 228, 1)),
+            (-36, (1, 197, 1)),
+            (-26, (7, 172, 4)),
+            (-20, (6, 143, 3)),
+            (-10, (4, 114, 2)),
+            (-1, (124, 151, 123)),
+            (0, (152, 119, 119)),
+            (10, (137, 0, 0)),
+            (20, (162, 0, 0)),
+            (26, (185, 0, 0)),
+            (36, (216, 0, 0)),
+            (50, (239, 0, 0)),
+            (64, (254, 0, 0)),
+        ],
+    },
+    # Precipitation accumulation in inches
+    'accumulation': {
+        'units': 'in',
+        'threshold': 1.0,
+        # Clear pixels mean no rain fell, not missing data
+        'clear_value': 0.0,
+        'colors': [
+            (0.05, (4, 233, 231)),
+            (0.1, (1, 159, 244)),
+            (0.25, (3, 0, 244)),
+            (0.5, (2, 253, 2)),
+            (0.75, (1, 197, 1)),
+            (1.0, (0, 142, 0)),
+            (1.5, (253, 248, 2)),
+            (2.0, (229, 188, 0)),
+            (2.5, (253, 149, 0)),
+            (3.0, (253, 0, 0)),
+            (4.0, (212, 0, 0)),
+            (5.0, (188, 0, 0)),
+            (6.0, (248, 0, 253)),
+            (8.0, (152, 84, 198)),
+            (10.0, (253, 253, 253)),
+        ],
+    },
+}
+
+# Bits kept per channel when building the color lookup tables
+LUT_BITS = 6
+
+# Colors further than this (euclidean RGB distance) from every legend
+# entry are treated as no data (map labels, borders, antialiasing noise)
+MAX_COLOR_DISTANCE = 48.0
+
+# Level index used for transparent or unrecognised pixels
+NO_DATA = 255
+
+_lut_cache = {}
+_level_cache = {}
+
+
+def _build_lut(palette_name):
+    """
+    Build a quantized RGBA -> legend level lookup table for a palette.
+
+    The table is indexed by (opaque << 3*LUT_BITS) | (b << 2*LUT_BITS) |
+    (g << LUT_BITS) | r, with LUT_BITS kept per channel; the transparent
+    half of the table is all NO_DATA.
+    """
+    palette = PALETTES[palette_name]
+    colors = np.array([c for _, c in palette['colors']], dtype=np.float32)
+
+    levels = 1 << LUT_BITS
+    step = 256 // levels
+    centers = np.arange(levels, dtype=np.float32) * step + (step - 1) / 2.0
+    b, g, r = np.meshgrid(centers, centers, centers, indexing='ij')
+    grid = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+    # One pass per legend entry keeps the temporaries at (levels**3, 3)
+    best = np.full(len(grid), np.inf, dtype=np.float32)
+    opaque = np.full(len(grid), NO_DATA, dtype=np.uint8)
+    for level, color in enumerate(colors):
+        dist = ((grid - color) ** 2).sum(axis=1)
+        closer = dist < best
+        best[closer] = dist[closer]
+        opaque[closer] = level
+    opaque[best > MAX_COLOR_DISTANCE ** 2] = NO_DATA
+    return np.concatenate([np.full(len(grid), NO_DATA, dtype=np.uint8), opaque])
+
+
+def get_lut(palette_name):
+    """Return the (cached) lookup table for a palette."""
+    lut = _lut_cache.get(palette_name)
+    if lut is None:
+        lut = _lut_cache[palette_name] = _build_lut(palette_name)
+    return lut
+
+
+def level_values(palette_name):
+    """Physical value of each level index (256 entries, NaN for unused levels)."""
+    table = _level_cache.get(palette_name)
+    if table is None:
+        table = np.full(256, np.nan, dtype=np.float32)
+        for level, (value, _) in enumerate(PALETTES[palette_name]['colors']):
+            table[level] = value
+        _level_cache[palette_name] = table
+    return table
+
+
+def decode_levels(rgba, palette_name):
+    """
+    Convert an RGBA image array (H, W, 4) to legend level indices.
+
+    Returns a uint8 array of shape (H, W); transparent (alpha < 128) and
+    unrecognised pixels are NO_DATA.  Levels are a quarter of the size of
+    float values, so frames are kept in this form.
+    """
+    lut = get_lut(palette_name)
+    # View each pixel as one little-endian uint32: 0xAABBGGRR
+    packed = np.ascontiguousarray(rgba).view('<u4')[..., 0]
+    shift = 8 - LUT_BITS
+    mask = (1 << LUT_BITS) - 1
+    index = (packed >> 31) << (3 * LUT_BITS)
+    index |= (packed >> shift) & mask
+    index |= (packed >> (8 + shift - LUT_BITS)) & (mask << LUT_BITS)
+    index |= (packed >> (16 + shift - 2 * LUT_BITS)) & (mask << (2 * LUT_BITS))
+    return lut[index]
+
+
+def decode_values(rgba, palette_name):
+    """
+    Convert an RGBA image array (H, W, 4) to physical values.
+
+    Returns a float32 array of shape (H, W) with NaN for transparent or
+    unrecognised pixels.
+    """
+    return level_values(palette_name)[decode_levels(rgba, palette_name)]
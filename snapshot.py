@@ -0,0 +1,203 @@
+"""
+Warm-start snapshots
+Writes the frame store (PNG bytes and metadata), the capabilities index
+and the decoded levels of the most recent frames to local disk, and maps
+them back in on boot so a restarted process answers from cache instead of
+sending every worker to NOAA at once.  A snapshot records the upstream
+base URL it was taken from and is only restored against the same one.
+
+Layout of one snapshot generation:
+
+    manifest.json     metadata, capabilities index, offsets into frames.bin
+    frames.bin        PNG bytes of every frame, concatenated
+    levels-N.npy      decoded levels of frame N (uint8, memory-mapped on load)
+
+Generations are written to their own directory and published by
+atomically replacing the CURRENT pointer file, so several workers can
+write to the same directory.
+"""
+import atexit
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from frames import Frame
+
+SNAPSHOT_VERSION = 1
+
+# Decoded levels are kept for this many of the most recently used frames
+SNAPSHOT_DECODED = 12
+
+# Generations other than the current one are removed once this old (seconds)
+STALE_GENERATION_AGE = 600
+
+
+def _current_path(directory):
+    with open(os.path.join(directory, 'CURRENT')) as f:
+        return os.path.join(directory, f.read().strip())
+
+
+def write_snapshot(directory, frame_store, capabilities_index, upstream, max_decoded=SNAPSHOT_DECODED):
+    """Write a new snapshot generation and make it current; returns its path"""
+    os.makedirs(directory, exist_ok=True)
+    name = f'snap-{time.time_ns()}-{os.getpid()}'
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+
+    frames = frame_store.snapshot()
+    decoded = {id(f) for f in [f for f in frames if f.decoded][-max_decoded:]}
+    entries = []
+    offset = 0
+    with open(os.path.join(path, 'frames.bin'), 'wb') as out:
+        for i, frame in enumerate(frames):
+            # Frames restored from a snapshot stay memory-mapped
+            content = frame.content_view
+            out.write(content)
+            entry = {
+                'station': frame.station,
+                'layer_id': frame.layer_id,
+                'time': frame.time,
+                'url': frame.url,
+                'source': frame.source,
+                'fetched_at': frame.fetched_at.isoformat(),
+                'png': [offset, len(content)],
+                'levels': None,
+            }
+            offset += len(content)
+            levels = frame.levels if id(frame) in decoded else None
+            if levels is not None:
+                entry['levels'] = f'levels-{i}.npy'
+                np.save(os.path.join(path, entry['levels']), np.ascontiguousarray(levels))
+            entries.append(entry)
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'upstream': upstream,
+        'written_at': datetime.now().astimezone().isoformat(),
+        'capabilities': {ws: {'age': age, 'layers': index}
+                         for ws, (age, index) in capabilities_index.export().items()},
+        'frames': entries,
+    }
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    pointer = os.path.join(directory, f'CURRENT.{os.getpid()}')
+    with open(pointer, 'w') as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(directory, 'CURRENT'))
+    _remove_stale_generations(directory, name)
+    return path
+
+
+def _remove_stale_generations(directory, keep):
+    now = time.time()
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry == keep or not entry.startswith('snap-') or not os.path.isdir(path):
+            continue
+        # Other workers may still be writing recent generations
+        if now - os.path.getmtime(path) > STALE_GENERATION_AGE:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def restore_snapshot(directory, frame_store, capabilities_index, upstream):
+    """
+    Load the current snapshot, if any; returns (frames, decoded frames) restored.
+
+    Snapshots of another upstream (e.g. a benchmark's mock GeoServer) are
+    ignored, so their frames are never served as live data.
+
+    Only the manifest is read here.  PNG bytes and levels stay in the
+    page cache behind memory maps until a request touches them.
+    """
+    try:
+        path = _current_path(directory)
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return 0, 0
+    if manifest.get('version') != SNAPSHOT_VERSION or manifest.get('upstream') != upstream:
+        return 0, 0
+
+    # Capability ages also count the time since the snapshot was written
+    downtime = max(0.0, time.time() - datetime.fromisoformat(manifest['written_at']).timestamp())
+    capabilities_index.restore({ws: (entry['age'] + downtime, entry['layers'])
+                                for ws, entry in manifest['capabilities'].items()})
+
+    with open(os.path.join(path, 'frames.bin'), 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) if size else memoryview(b'')
+    frames = []
+    decoded = 0
+    for entry in manifest['frames']:
+        start, length = entry['png']
+        frame = Frame(entry['station'], entry['layer_id'], entry['time'],
+                      data[start:start + length], entry['url'], entry['source'])
+        frame.fetched_at = datetime.fromisoformat(entry['fetched_at'])
+        if entry['levels']:
+            frame.restore_levels(np.load(os.path.join(path, entry['levels']), mmap_mode='r'))
+            decoded += 1
+        frames.append(frame)
+    frame_store.restore(frames)
+    return len(frames), decoded
+
+
+class SnapshotWriter:
+    """
+    Periodically snapshots a frame store and capabilities index.
+
+    A snapshot is only written when the set of frames (or of decoded
+    frames) changed since the last one, and once more at interpreter exit.
+    The thread is started per process on first use, so it also runs in
+    workers forked from a preloading master.
+    """
+
+    def __init__(self, directory, frame_store, capabilities_index, upstream, interval=60.0, logger=None):
+        self.directory = directory
+        self.upstream = upstream
+        self._frame_store = frame_store
+        self._capabilities_index = capabilities_index
+        self.interval = interval
+        self._logger = logger
+        self._pid = None
+        self._written = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._written = self._signature()
+            threading.Thread(target=self._run, name='snapshot-writer', daemon=True).start()
+            atexit.register(self.write_if_changed)
+
+    def _signature(self):
+        frames = self._frame_store.snapshot()
+        return frozenset(f.key for f in frames), frozenset(f.key for f in frames if f.decoded)
+
+    def write_if_changed(self):
+        signature = self._signature()
+        if signature == self._written or not signature[0]:
+            return None
+        try:
+            path = write_snapshot(self.directory, self._frame_store, self._capabilities_index, self.upstream)
+        except OSError as e:
+            if self._logger:
+                self._logger.warning(f"Snapshot to {self.directory} failed: {e}")
+            return None
+        self._written = signature
+        return path
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.write_if_changed()
@@ -0,0 +1,220 @@
+"""
+NEXRAD radar stations
+A flat table of constants.  Python compiles it into the module as one
+constant tuple, so importing it builds no per-station objects.
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+# (identifier, name, state, latitude, longitude)
+STATION_TABLE = (
+    ('KABR', 'Aberdeen', 'South Dakota', 45.4558, -98.4132),
+    ('KABX', 'Albuquerque', 'New Mexico', 35.1497, -106.8244),
+    ('KAKQ', 'Norfolk/Wakefield', 'Virginia', 36.984, -77.0074),
+    ('KAMA', 'Amarillo', 'Texas', 35.2333, -101.7092),
+    ('KAMX', 'Miami', 'Florida', 25.6111, -80.4128),
+    ('KAPX', 'Gaylord', 'Michigan', 44.9067, -84.7197),
+    ('KARX', 'La Crosse', 'Wisconsin', 43.8228, -91.1914),
+    ('KATX', 'Seattle/Tacoma', 'Washington', 48.1947, -122.4958),
+    ('KBBX', 'Beale AFB', 'California', 39.4961, -121.6317),
+    ('KBGM', 'Binghamton', 'New York', 42.1997, -75.9847),
+    ('KBHX', 'Eureka', 'California', 40.4986, -124.2919),
+    ('KBIS', 'Bismarck', 'North Dakota', 46.7708, -100.7603),
+    ('KBLX', 'Billings', 'Montana', 45.8536, -108.6061),
+    ('KBMX', 'Birmingham', 'Alabama', 33.1722, -86.7697),
+    ('KBOX', 'Boston', 'Massachusetts', 41.9556, -71.1367),
+    ('KBRO', 'Brownsville', 'Texas', 25.9161, -97.4189),
+    ('KBUF', 'Buffalo', 'New York', 42.9489, -78.7369),
+    ('KBYX', 'Key West', 'Florida', 24.5975, -81.7031),
+    ('KCAE', 'Columbia', 'South Carolina', 33.9489, -81.1186),
+    ('KCBW', 'Houlton', 'Maine', 46.0392, -67.8067),
+    ('KCBX', 'Boise', 'Idaho', 43.4906, -116.2356),
+    ('KCCX', 'State College', 'Pennsylvania', 40.9231, -78.0036),
+    ('KCLE', 'Cleveland', 'Ohio', 41.4133, -81.8597),
+    ('KCLX', 'Charleston', 'South Carolina', 32.6556, -81.0422),
+    ('KCRP', 'Corpus Christi', 'Texas', 27.7842, -97.5111),
+    ('KCXX', 'Burlington', 'Vermont', 44.5111, -73.1667),
+    ('KCYS', 'Cheyenne', 'Wyoming', 41.1519, -104.8061),
+    ('KDAX', 'Sacramento', 'California', 38.5011, -121.6778),
+    ('KDDC', 'Dodge City', 'Kansas', 37.7608, -99.9689),
+    ('KDFX', 'Laughlin AFB', 'Texas', 29.2731, -100.2803),
+    ('KDGX', 'Jackson', 'Mississippi', 32.2803, -89.9844),
+    ('KDIX', 'Philadelphia', 'New Jersey', 39.9469, -74.4111),
+    ('KDLH', 'Duluth', 'Minnesota', 46.8369, -92.2097),
+    ('KDMX', 'Des Moines', 'Iowa', 41.7311, -93.7231),
+    ('KDOX', 'Dover AFB', 'Delaware', 38.8256, -75.44),
+    ('KDTX', 'Detroit', 'Michigan', 42.6997, -83.4717),
+    ('KDVN', 'Davenport', 'Iowa', 41.6117, -90.5808),
+    ('KEAX', 'Kansas City', 'Missouri', 38.8103, -94.2644),
+    ('KEMX', 'Tucson', 'Arizona', 31.8936, -110.63),
+    ('KENX', 'Albany', 'New York', 42.5864, -74.0639),
+    ('KEOX', 'Fort Rucker', 'Alabama', 31.4606, -85.4594),
+    ('KEPZ', 'El Paso', 'Texas', 31.8731, -106.6978),
+    ('KESX', 'Las Vegas', 'Nevada', 35.7011, -114.8919),
+    ('KEVX', 'Eglin AFB', 'Florida', 30.5644, -85.9214),
+    ('KEWX', 'Austin/San Antonio', 'Texas', 29.7039, -98.0283),
+    ('KEYX', 'Edwards AFB', 'California', 35.0978, -117.5606),
+    ('KFCX', 'Roanoke', 'Virginia', 37.0242, -80.2742),
+    ('KFDR', 'Altus AFB', 'Oklahoma', 34.3622, -98.9761),
+    ('KFDX', 'Cannon AFB', 'New Mexico', 34.6347, -103.6186),
+    ('KFFC', 'Atlanta', 'Georgia', 33.3636, -84.5658),
+    ('KFSD', 'Sioux Falls', 'South Dakota', 43.5878, -96.7289),
+    ('KFSX', 'Flagstaff', 'Arizona', 34.5744, -111.1983),
+    ('KFTG', 'Denver', 'Colorado', 39.7867, -104.5458),
+    ('KFWS', 'Dallas/Fort Worth', 'Texas', 32.5731, -97.3031),
+    ('KGGW', 'Glasgow', 'Montana', 48.2064, -106.625),
+    ('KGJX', 'Grand Junction', 'Colorado', 39.0619, -108.2139),
+    ('KGLD', 'Goodland', 'Kansas', 39.3667, -101.7),
+    ('KGRB', 'Green Bay', 'Wisconsin', 44.4986, -88.1117),
+    ('KGRK', 'Fort Hood', 'Texas', 30.7217, -97.3831),
+    ('KGRR', 'Grand Rapids', 'Michigan', 42.8939, -85.5447),
+    ('KGSP', 'Greer', 'South Carolina', 34.8833, -82.22),
+    ('KGWX', 'Columbus AFB', 'Mississippi', 33.8967, -88.3292),
+    ('KGYX', 'Portland', 'Maine', 43.8914, -70.2564),
+    ('KHDX', 'Holloman AFB', 'New Mexico', 33.0786, -106.1222),
+    ('KHGX', 'Houston/Galveston', 'Texas', 29.4719, -95.0792),
+    ('KHNX', 'San Joaquin Valley', 'California', 36.3142, -119.6322),
+    ('KHPX', 'Fort Campbell', 'Kentucky', 36.7367, -87.2856),
+    ('KHTX', 'Huntsville', 'Alabama', 34.9306, -86.0836),
+    ('KICT', 'Wichita', 'Kansas', 37.6544, -97.4431),
+    ('KILX', 'Lincoln', 'Illinois', 40.1506, -89.3367),
+    ('KIND', 'Indianapolis', 'Indiana', 39.7075, -86.2803),
+    ('KINX', 'Tulsa', 'Oklahoma', 36.175, -95.5644),
+    ('KIWA', 'Phoenix', 'Arizona', 33.2892, -111.67),
+    ('KIWX', 'North Webster', 'Indiana', 41.3586, -85.7),
+    ('KJAX', 'Jacksonville', 'Florida', 30.4847, -81.7019),
+    ('KJGX', 'Robins AFB', 'Georgia', 32.675, -83.3511),
+    ('KJKL', 'Jackson', 'Kentucky', 37.5906, -83.3131),
+    ('KLBB', 'Lubbock', 'Texas', 33.6539, -101.8142),
+    ('KLCH', 'Lake Charles', 'Louisiana', 30.1253, -93.2158),
+    ('KLIX', 'New Orleans', 'Louisiana', 30.3367, -89.8256),
+    ('KLNX', 'North Platte', 'Nebraska', 41.9581, -100.5758),
+    ('KLOT', 'Chicago', 'Illinois', 41.6044, -88.0844),
+    ('KLRX', 'Elko', 'Nevada', 40.7397, -116.8028),
+    ('KLSX', 'St. Louis', 'Missouri', 38.6989, -90.6828),
+    ('KLTX', 'Wilmington', 'North Carolina', 33.9892, -78.4292),
+    ('KLVX', 'Louisville', 'Kentucky', 37.9753, -85.9436),
+    ('KLWX', 'Sterling', 'Virginia', 38.9754, -77.4778),
+    ('KLZK', 'Little Rock', 'Arkansas', 34.8364, -92.2622),
+    ('KMAF', 'Midland/Odessa', 'Texas', 31.9433, -102.1892),
+    ('KMAX', 'Medford', 'Oregon', 42.0811, -122.7175),
+    ('KMBX', 'Minot AFB', 'North Dakota', 48.3925, -100.8644),
+    ('KMHX', 'Morehead City', 'North Carolina', 34.7756, -76.8761),
+    ('KMKX', 'Milwaukee', 'Wisconsin', 42.9678, -88.5506),
+    ('KMLB', 'Melbourne', 'Florida', 28.1133, -80.6542),
+    ('KMOB', 'Mobile', 'Alabama', 30.6794, -88.2397),
+    ('KMPX', 'Minneapolis/St. Paul', 'Minnesota', 44.8489, -93.5653),
+    ('KMQT', 'Marquette', 'Michigan', 46.5311, -87.5486),
+    ('KMRX', 'Knoxville/Tri-Cities', 'Tennessee', 36.1686, -83.4017),
+    ('KMSX', 'Missoula', 'Montana', 47.0414, -113.9864),
+    ('KMTX', 'Salt Lake City', 'Utah', 41.2628, -112.4453),
+    ('KMUX', 'San Francisco', 'California', 37.1553, -121.8981),
+    ('KMVX', 'Grand Forks', 'North Dakota', 47.5281, -97.3256),
+    ('KMXX', 'Maxwell AFB', 'Alabama', 32.5367, -85.7897),
+    ('KNKX', 'San Diego', 'California', 32.9189, -117.0419),
+    ('KNQA', 'Millington', 'Tennessee', 35.3447, -89.8736),
+    ('KOAX', 'Omaha', 'Nebraska', 41.3203, -96.3667),
+    ('KOHX', 'Nashville', 'Tennessee', 36.2472, -86.5625),
+    ('KOKX', 'New York City', 'New York', 40.8656, -72.8644),
+    ('KOTX', 'Spokane', 'Washington', 47.6803, -117.6267),
+    ('KPAH', 'Paducah', 'Kentucky', 37.0683, -88.7719),
+    ('KPBZ', 'Pittsburgh', 'Pennsylvania', 40.5317, -80.2178),
+    ('KPDT', 'Pendleton', 'Oregon', 45.6906, -118.8528),
+    ('KPOE', 'Fort Polk', 'Louisiana', 31.1556, -92.9761),
+    ('KPUX', 'Pueblo', 'Colorado', 38.4594, -104.1814),
+    ('KRAX', 'Raleigh/Durham', 'North Carolina', 35.6656, -78.4897),
+    ('KRGX', 'Reno', 'Nevada', 39.7542, -119.4622),
+    ('KRIW', 'Riverton', 'Wyoming', 43.0661, -108.4769),
+    ('KRLX', 'Charleston', 'West Virginia', 38.3111, -81.7231),
+    ('KRMX', 'Griffiss AFB', 'New York', 43.4678, -75.4581),
+    ('KRTX', 'Portland', 'Oregon', 45.715, -122.9653),
+    ('KSFX', 'Pocatello/Idaho Falls', 'Idaho', 43.1058, -112.6856),
+    ('KSGF', 'Springfield', 'Missouri', 37.2353, -93.4006),
+    ('KSHV', 'Shreveport', 'Louisiana', 32.4506, -93.8414),
+    ('KSJT', 'San Angelo', 'Texas', 31.3711, -100.4925),
+    ('KSOX', 'Santa Ana Mountains', 'California', 33.8175, -117.6361),
+    ('KSRX', 'Western Arkansas', 'Arkansas', 35.2906, -94.3619),
+    ('KTBW', 'Tampa Bay', 'Florida', 27.7056, -82.4017),
+    ('KTFX', 'Great Falls', 'Montana', 47.4597, -111.3853),
+    ('KTLH', 'Tallahassee', 'Florida', 30.3975, -84.3289),
+    ('KTLX', 'Oklahoma City', 'Oklahoma', 35.3331, -97.2778),
+    ('KTWX', 'Topeka', 'Kansas', 38.9969, -96.2322),
+    ('KTYX', 'Montpelier', 'New York', 43.7556, -75.68),
+    ('KUDX', 'Rapid City', 'South Dakota', 44.125, -102.8297),
+    ('KUEX', 'Hastings', 'Nebraska', 40.3208, -98.4417),
+    ('KVAX', 'Moody AFB', 'Georgia', 30.8903, -83.0019),
+    ('KVBX', 'Vandenberg AFB', 'California', 34.8381, -120.3978),
+    ('KVNX', 'Vance AFB', 'Oklahoma', 36.7406, -98.1281),
+    ('KVTX', 'Los Angeles', 'California', 34.4119, -119.1797),
+    ('KVWX', 'Evansville', 'Indiana', 38.26, -87.7244),
+    ('KYUX', 'Yuma', 'Arizona', 32.4953, -114.6567),
+)
+
+
+Station = namedtuple('Station', 'id name state lat lon')
+
+
+def _encoded(payload):
+    """Compact JSON bytes of a payload and their ETag"""
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    return body, hashlib.sha1(body).hexdigest()[:20]
+
+
+class StationRegistry:
+    """
+    Immutable station registry, built once.
+
+    Stations are kept as a tuple of rows sorted by (state, id) with an
+    id -> row index for O(1) lookups.  The JSON payloads served by the API
+    (the full list, per-state groups, per-station info) are encoded up
+    front as (bytes, etag) pairs, so handlers only pick one.
+    """
+
+    def __init__(self, table=STATION_TABLE):
+        self.stations = tuple(Station(*row) for row in sorted(table, key=lambda row: (row[2], row[0])))
+        self._index = {station.id: i for i, station in enumerate(self.stations)}
+        self.states = tuple(sorted({station.state for station in self.stations}))
+
+        rows = [station._asdict() for station in self.stations]
+        self.list_json = _encoded(rows)
+        by_state = {state: [row for row in rows if row['state'] == state] for state in self.states}
+        self.by_state_json = _encoded(by_state)
+        self._state_json = {state: _encoded(group) for state, group in by_state.items()}
+        self._info_json = {row['id']: _encoded(row) for row in rows}
+        self._current_json = {
+            station.id: _encoded({'station_id': station.id, 'name': station.name, 'state': station.state,
+                                  'lat': station.lat, 'lon': station.lon})
+            for station in self.stations
+        }
+
+    def __contains__(self, station_id):
+        return station_id in self._index
+
+    def __len__(self):
+        return len(self.stations)
+
+    def __iter__(self):
+        return iter(self.stations)
+
+    def __getitem__(self, station_id):
+        return self.stations[self._index[station_id]]
+
+    def get(self, station_id, default=None):
+        i = self._index.get(station_id)
+        return default if i is None else self.stations[i]
+
+    def info_json(self, station_id):
+        """(bytes, etag) of {id, name, state, lat, lon}, or None"""
+        return self._info_json.get(station_id)
+
+    def current_json(self, station_id):
+        """(bytes, etag) of the current-station payload {station_id, name, state, lat, lon}"""
+        return self._current_json.get(station_id)
+
+    def state_json(self, state):
+        """(bytes, etag) of the stations of one state, or None"""
+        return self._state_json.get(state)
+
+
+RADAR_STATIONS = StationRegistry()
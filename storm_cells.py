@@ -0,0 +1,249 @@
+"""
+Storm cell detection and tracking
+Segments reflectivity cells (connected regions above a dBZ threshold) on
+decoded frames and tracks them between consecutive scans.  Everything is
+done with array operations so a frame costs a few milliseconds.
+"""
+import math
+
+import numpy as np
+
+# Reflectivity a pixel needs to be part of a cell
+CELL_THRESHOLD_DBZ = 40.0
+
+# Frames are reduced by this factor (block maximum) before segmentation
+DOWNSAMPLE = 4
+
+# Cells smaller than this many downsampled pixels are ignored
+MIN_CELL_PIXELS = 4
+
+# Matches implying a faster motion than this are rejected
+MAX_CELL_SPEED_KMH = 150.0
+
+# Lead times for extrapolated positions
+FORECAST_MINUTES = (10, 20, 30)
+
+# Median per-frame budget for decode + segmentation, checked by the benchmarks
+FRAME_BUDGET_MS = 150.0
+
+KM_PER_DEG = 111.32
+
+
+def block_max(values, factor=DOWNSAMPLE):
+    """
+    Reduce a 2D array by taking the maximum of each factor x factor block.
+
+    NaN (no data) is ignored; blocks with no data at all stay NaN.
+    """
+    h, w = values.shape
+    values = values[:h - h % factor, :w - w % factor]
+    # Strided slices keep this to 2 * factor whole-array operations
+    cols = values[:, 0::factor]
+    for k in range(1, factor):
+        cols = np.fmax(cols, values[:, k::factor])
+    reduced = cols[0::factor]
+    for k in range(1, factor):
+        reduced = np.fmax(reduced, cols[k::factor])
+    return reduced
+
+
+def label_components(mask):
+    """
+    Label 8-connected regions of a boolean mask.
+
+    Uses parallel union-find (hook to the smaller root, then pointer
+    jumping) over the neighbour edges, so the number of Python-level
+    iterations grows with log(component size) rather than pixel count.
+    Returns (labels, count) where labels is 0 for background.
+    """
+    h, w = mask.shape
+    flat = mask.ravel()
+    pixels = np.flatnonzero(flat)
+    labels = np.zeros(h * w, dtype=np.int32)
+    if pixels.size == 0:
+        return labels.reshape(h, w), 0
+
+    index = np.arange(h * w, dtype=np.int64).reshape(h, w)
+    edges_a = []
+    edges_b = []
+    # right, down, down-right, down-left neighbours
+    for a, b in (
+        ((slice(None), slice(None, -1)), (slice(None), slice(1, None))),
+        ((slice(None, -1), slice(None)), (slice(1, None), slice(None))),
+        ((slice(None, -1), slice(None, -1)), (slice(1, None), slice(1, None))),
+        ((slice(None, -1), slice(1, None)), (slice(1, None), slice(None, -1))),
+    ):
+        both = mask[a] & mask[b]
+        edges_a.append(index[a][both])
+        edges_b.append(index[b][both])
+    ea = np.concatenate(edges_a)
+    eb = np.concatenate(edges_b)
+
+    parent = np.arange(h * w, dtype=np.int64)
+    while ea.size:
+        pa = parent[ea]
+        pb = parent[eb]
+        split = pa != pb
+        if not split.any():
+            break
+        ea, eb, pa, pb = ea[split], eb[split], pa[split], pb[split]
+        np.minimum.at(parent, np.maximum(pa, pb), np.minimum(pa, pb))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+    _, component = np.unique(parent[pixels], return_inverse=True)
+    labels[pixels] = component.astype(np.int32) + 1
+    return labels.reshape(h, w), int(component.max()) + 1
+
+
+def detect_cells(values, grid, threshold=CELL_THRESHOLD_DBZ, factor=DOWNSAMPLE, min_pixels=MIN_CELL_PIXELS):
+    """
+    Find reflectivity cells in a decoded frame.
+
+    values is the (height, width) dBZ array of a frame requested on grid
+    (see georef.Grid).  Returns a dict of equal-length
+    arrays: lat, lon (dBZ-weighted centroid), area_km2, max_dbz, mean_dbz.
+    """
+    reduced = block_max(values, factor)
+    labels, count = label_components(reduced >= threshold)
+
+    empty = np.zeros(0, dtype=np.float64)
+    if count == 0:
+        return {'lat': empty, 'lon': empty, 'area_km2': empty, 'max_dbz': empty, 'mean_dbz': empty}
+
+    lab = labels.ravel()
+    inside = np.flatnonzero(lab)
+    lab = lab[inside]
+    dbz = reduced.ravel()[inside]
+    rows, cols = np.divmod(inside, reduced.shape[1])
+
+    pixels = np.bincount(lab, minlength=count + 1)
+    weight = np.bincount(lab, weights=dbz, minlength=count + 1)
+    row_c = np.bincount(lab, weights=rows * dbz, minlength=count + 1)
+    col_c = np.bincount(lab, weights=cols * dbz, minlength=count + 1)
+    peak = np.full(count + 1, -np.inf)
+    np.maximum.at(peak, lab, dbz)
+
+    keep = np.flatnonzero(pixels >= min_pixels)
+    keep = keep[keep > 0]
+    pixels, weight, peak = pixels[keep], weight[keep], peak[keep]
+    # Centroids in full-resolution pixel coordinates
+    row_c = (row_c[keep] / weight + 0.5) * factor
+    col_c = (col_c[keep] / weight + 0.5) * factor
+
+    lon, lat = grid.to_lonlat(col_c, row_c)
+    row_area = np.interp(row_c - 0.5, np.arange(grid.height), grid.row_area_km2)
+    cell_km2 = row_area * factor * factor
+
+    return {
+        'lat': lat,
+        'lon': lon,
+        'area_km2': pixels * cell_km2,
+        'max_dbz': peak,
+        'mean_dbz': weight / pixels,
+    }
+
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    """Pairwise equirectangular distances between two sets of points"""
+    mean_lat = np.radians((lat1[:, None] + lat2[None, :]) / 2.0)
+    dy = (lat2[None, :] - lat1[:, None]) * KM_PER_DEG
+    dx = (lon2[None, :] - lon1[:, None]) * KM_PER_DEG * np.cos(mean_lat)
+    return np.hypot(dx, dy)
+
+
+def match_cells(prev, curr, dt_seconds, max_speed_kmh=MAX_CELL_SPEED_KMH):
+    """
+    Match cells between two consecutive frames.
+
+    Pairs are mutual nearest neighbours whose implied speed is plausible.
+    Returns (prev_index, curr_index) arrays.
+    """
+    none = np.zeros(0, dtype=np.int64)
+    if len(prev['lat']) == 0 or len(curr['lat']) == 0 or dt_seconds <= 0:
+        return none, none
+    dist = _distance_km(prev['lat'], prev['lon'], curr['lat'], curr['lon'])
+    nearest_curr = dist.argmin(axis=1)
+    nearest_prev = dist.argmin(axis=0)
+    prev_index = np.arange(len(prev['lat']))
+    mutual = nearest_prev[nearest_curr] == prev_index
+    gate = max_speed_kmh * dt_seconds / 3600.0
+    ok = mutual & (dist[prev_index, nearest_curr] <= gate)
+    return prev_index[ok], nearest_curr[ok]
+
+
+def track_cells(history, forecast_minutes=FORECAST_MINUTES):
+    """
+    Track cells through a sequence of frames.
+
+    history is a list of (scan_time, cells) oldest first, where cells is
+    the output of detect_cells.  Returns one dict per cell of the newest
+    frame with its track, motion vector and extrapolated positions.
+    """
+    if not history:
+        return []
+
+    # track_ids[i] holds the track id of each cell in frame i
+    _, first = history[0]
+    track_ids = [np.arange(len(first['lat']))]
+    next_id = len(first['lat'])
+    for (t_prev, prev), (t_curr, curr) in zip(history, history[1:]):
+        ids = np.full(len(curr['lat']), -1, dtype=np.int64)
+        p, c = match_cells(prev, curr, (t_curr - t_prev).total_seconds())
+        ids[c] = track_ids[-1][p]
+        new = ids < 0
+        ids[new] = np.arange(next_id, next_id + int(new.sum()))
+        next_id += int(new.sum())
+        track_ids.append(ids)
+
+    latest_time, latest = history[-1]
+    results = []
+    for i, track_id in enumerate(track_ids[-1]):
+        track = []
+        for (scan_time, cells), ids in zip(history, track_ids):
+            hit = np.flatnonzero(ids == track_id)
+            if hit.size:
+                j = hit[0]
+                track.append((scan_time, float(cells['lat'][j]), float(cells['lon'][j])))
+
+        lat = float(latest['lat'][i])
+        lon = float(latest['lon'][i])
+        cell = {
+            'id': int(track_id),
+            'lat': round(lat, 4),
+            'lon': round(lon, 4),
+            'area_km2': round(float(latest['area_km2'][i]), 1),
+            'max_dbz': round(float(latest['max_dbz'][i]), 1),
+            'mean_dbz': round(float(latest['mean_dbz'][i]), 1),
+            'track': [{'time': t.isoformat(), 'lat': round(a, 4), 'lon': round(o, 4)} for t, a, o in track],
+            'motion': None,
+            'forecast': [],
+        }
+
+        # Motion from the oldest point on the track for a steadier estimate
+        if len(track) >= 2:
+            t0, lat0, lon0 = track[0]
+            hours = (latest_time - t0).total_seconds() / 3600.0
+            if hours > 0:
+                cos_lat = math.cos(math.radians(lat))
+                u = (lon - lon0) * KM_PER_DEG * cos_lat / hours  # eastward km/h
+                v = (lat - lat0) * KM_PER_DEG / hours  # northward km/h
+                cell['motion'] = {
+                    'u_kmh': round(u, 1),
+                    'v_kmh': round(v, 1),
+                    'speed_kmh': round(math.hypot(u, v), 1),
+                    'heading_deg': round(math.degrees(math.atan2(u, v)) % 360.0, 0),
+                }
+                for minutes in forecast_minutes:
+                    lead = minutes / 60.0
+                    cell['forecast'].append({
+                        'minutes': minutes,
+                        'lat': round(lat + v * lead / KM_PER_DEG, 4),
+                        'lon': round(lon + u * lead / (KM_PER_DEG * cos_lat), 4),
+                    })
+        results.append(cell)
+    return results
+
@@ -6,6 +6,7 @@ WEATHER_LAYERS = {
         'layer': 'conus:conus_bref_qcd',
         'service': 'conus',
         'legend_url': None,
+        'palette': 'reflectivity',
         'default': True
     },
     'composite_reflectivity': {
@@ -13,7 +14,8 @@ WEATHER_LAYERS = {
         'description': 'Composite radar reflectivity (highest intensity at each location)',
         'layer': 'conus:conus_cref_qcd',
         'service': 'conus',
-        'legend_url': None
+        'legend_url': None,
+        'palette': 'reflectivity'
     },
     'echo_tops': {
         'name': 'Echo Top Heights',
@@ -35,6 +37,7 @@ WEATHER_LAYERS = {
         'layer': 'conus:{station}_BREF',
         'service': 'conus',
         'legend_url': None,
+        'palette': 'reflectivity',
         'dynamic_station': True
     },
     'super_res_velocity': {
@@ -43,6 +46,7 @@ WEATHER_LAYERS = {
         'layer': '{station_lower}_sr_bvel',
         'service': 'station-specific',
         'legend_url': None,
+        'palette': 'velocity',
         'dynamic_station': True,
         'available': True,
         'high_res': True
@@ -53,6 +57,7 @@ WEATHER_LAYERS = {
         'layer': '{station_lower}_sr_bref',
         'service': 'station-specific',
         'legend_url': None,
+        'palette': 'reflectivity',
         'dynamic_station': True,
         'available': True,
         'high_res': True
@@ -73,6 +78,7 @@ WEATHER_LAYERS = {
         'layer': '{station_lower}_bdsa',
         'service': 'station-specific',
         'legend_url': None,
+        'palette': 'accumulation',
         'dynamic_station': True,
         'available': True
     },
@@ -82,6 +88,7 @@ WEATHER_LAYERS = {
         'layer': '{station_lower}_boha',
         'service': 'station-specific',
         'legend_url': None,
+        'palette': 'accumulation',
         'dynamic_station': True,
         'available': True
     }
@@ -0,0 +1,233 @@
+"""
+Zonal statistics over polygons
+Rasterizes GeoJSON polygons onto a frame grid once (all polygons in one
+vectorized scanline pass) and then reduces any frame on that grid to
+per-polygon min/mean/max/area statistics in a single pass.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+# Rasterized polygon sets kept per (grid, polygon set)
+MASK_CACHE_SIZE = 16
+
+# Median budget for the per-frame statistics pass, checked by the benchmarks
+ZONAL_STATS_BUDGET_MS = 200.0
+
+
+def _ring(where, ring):
+    """Validate one linear ring and return it as an (N, 2) lon/lat array"""
+    if not isinstance(ring, list) or len(ring) < 3:
+        raise ValueError(f'{where}: a ring needs at least 3 [lon, lat] positions')
+    try:
+        coords = np.asarray(ring, dtype=np.float64)
+    except (TypeError, ValueError):
+        coords = None
+    if coords is None or coords.ndim != 2 or coords.shape[1] < 2:
+        raise ValueError(f'{where}: positions must be [lon, lat] number pairs')
+    coords = coords[:, :2]
+    if not np.isfinite(coords).all():
+        raise ValueError(f'{where}: coordinates must be finite')
+    return coords
+
+
+def _rings(where, polygon):
+    if not isinstance(polygon, list) or not polygon:
+        raise ValueError(f'{where}: a polygon must be a non-empty list of rings')
+    return [_ring(f'{where}, ring {j}', ring) for j, ring in enumerate(polygon)]
+
+
+def parse_polygons(geojson):
+    """
+    Flatten GeoJSON into [(id, [ring, ...]), ...]; raises ValueError on malformed input.
+
+    Accepts a FeatureCollection, a Feature or a bare (Multi)Polygon.  Each
+    polygon of a MultiPolygon contributes its rings to the same feature;
+    holes fall out of the even-odd fill rule.  Rings are (N, 2) lon/lat
+    arrays.
+    """
+    if not isinstance(geojson, dict):
+        raise ValueError('GeoJSON must be an object')
+    if geojson.get('type') == 'FeatureCollection':
+        features = geojson.get('features', [])
+        if not isinstance(features, list):
+            raise ValueError('features must be a list')
+    elif geojson.get('type') == 'Feature':
+        features = [geojson]
+    else:
+        features = [{'type': 'Feature', 'geometry': geojson}]
+
+    polygons = []
+    for i, feature in enumerate(features):
+        if not isinstance(feature, dict):
+            raise ValueError(f'Feature {i}: must be an object')
+        geometry = feature.get('geometry')
+        if not isinstance(geometry, dict):
+            raise ValueError(f'Feature {i}: geometry must be an object')
+        kind = geometry.get('type')
+        coordinates = geometry.get('coordinates')
+        if kind == 'Polygon':
+            rings = _rings(f'Feature {i}', coordinates)
+        elif kind == 'MultiPolygon':
+            if not isinstance(coordinates, list) or not coordinates:
+                raise ValueError(f'Feature {i}: MultiPolygon coordinates must be a non-empty list of polygons')
+            rings = [ring for k, part in enumerate(coordinates) for ring in _rings(f'Feature {i}, polygon {k}', part)]
+        else:
+            raise ValueError(f'Feature {i}: unsupported geometry {kind!r}')
+        properties = feature.get('properties')
+        if not isinstance(properties, dict):
+            properties = {}
+        polygon_id = feature.get('id', properties.get('id', properties.get('name', i)))
+        polygons.append((polygon_id, rings))
+    return polygons
+
+
+def polygon_set_key(polygons):
+    """Stable hash of a polygon set, used as a cache key"""
+    digest = hashlib.sha1()
+    for polygon_id, rings in polygons:
+        digest.update(json.dumps(polygon_id, default=str).encode())
+        for ring in rings:
+            digest.update(np.ascontiguousarray(ring).tobytes())
+            digest.update(b'|')
+    return digest.hexdigest()
+
+
+def rasterize(polygons, grid):
+    """
+    Rasterize polygons onto a grid (see georef.Grid).
+
+    A pixel belongs to a polygon when its centre is inside (even-odd).
+    Returns (pixels, offsets): flat pixel indices grouped by polygon, and
+    offsets such that polygon i owns pixels[offsets[i]:offsets[i + 1]].
+    """
+    width, height = grid.width, grid.height
+    count = len(polygons)
+
+    # Every ring edge of every polygon, in fractional pixel coordinates
+    starts, ends, owner = [], [], []
+    for index, (_, rings) in enumerate(polygons):
+        for ring in rings:
+            x, y = grid.to_pixel(ring[:, 1], ring[:, 0])
+            points = np.stack([x, y], axis=1)
+            starts.append(points)
+            ends.append(np.roll(points, -1, axis=0))
+            owner.append(np.full(len(points), index, dtype=np.int64))
+    if not starts:
+        return np.zeros(0, dtype=np.int64), np.zeros(count + 1, dtype=np.int64)
+    p0 = np.concatenate(starts)
+    p1 = np.concatenate(ends)
+    owner = np.concatenate(owner)
+
+    # Rows whose pixel centre (row + 0.5) an edge crosses, half-open in y
+    y_lo = np.minimum(p0[:, 1], p1[:, 1])
+    y_hi = np.maximum(p0[:, 1], p1[:, 1])
+    first = np.clip(np.ceil(y_lo - 0.5), 0, height).astype(np.int64)
+    last = np.clip(np.ceil(y_hi - 0.5), 0, height).astype(np.int64)
+    rows_per_edge = last - first
+    edge = np.repeat(np.arange(len(p0)), rows_per_edge)
+    row = np.repeat(first, rows_per_edge) + (np.arange(edge.size) - np.repeat(np.cumsum(rows_per_edge) - rows_per_edge, rows_per_edge))
+
+    # Where each edge crosses each of its rows
+    yc = row + 0.5
+    t = (yc - p0[edge, 1]) / (p1[edge, 1] - p0[edge, 1])
+    xc = p0[edge, 0] + t * (p1[edge, 0] - p0[edge, 0])
+    poly = owner[edge]
+
+    # Sort crossings by polygon, row, x and pair them up (even-odd)
+    order = np.lexsort((xc, row, poly))
+    xc, row, poly = xc[order], row[order], poly[order]
+    x_from = np.clip(np.ceil(xc[0::2] - 0.5), 0, width).astype(np.int64)
+    x_to = np.clip(np.ceil(xc[1::2] - 0.5), 0, width).astype(np.int64)
+    span_row = row[0::2]
+    span_poly = poly[0::2]
+
+    # Expand spans to flat pixel indices
+    length = np.maximum(x_to - x_from, 0)
+    span = np.repeat(np.arange(length.size), length)
+    step = np.arange(span.size) - np.repeat(np.cumsum(length) - length, length)
+    pixels = span_row[span] * width + x_from[span] + step
+    pixel_poly = span_poly[span]
+
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pixel_poly, minlength=count), out=offsets[1:])
+    return pixels, offsets
+
+
+class MaskCache:
+    """LRU of rasterized polygon sets keyed by (grid, polygon set hash)"""
+
+    def __init__(self, size=MASK_CACHE_SIZE):
+        self._size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, polygons, grid, set_key=None):
+        if set_key is None:
+            set_key = polygon_set_key(polygons)
+        key = (grid.key, set_key)
+        with self._lock:
+            masks = self._entries.get(key)
+            if masks is not None:
+                self._entries.move_to_end(key)
+        metrics.cache_result('zonal_masks', masks is not None)
+        if masks is not None:
+            return masks
+        with metrics.span('zonal_rasterize'):
+            masks = rasterize(polygons, grid)
+        with self._lock:
+            self._entries[key] = masks
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return masks
+
+
+def zonal_stats(values, grid, masks, threshold=None):
+    """
+    Per-polygon statistics of a flattened-able (H, W) value array.
+
+    values holds NaN for no data.  Returns a dict of arrays (one entry per
+    polygon): pixels, valid_pixels, min, mean, max, area_km2 and, with a
+    threshold, area_over_threshold_km2.  Statistics of polygons with no
+    valid pixels are NaN.
+    """
+    pixels, offsets = masks
+    count = len(offsets) - 1
+    sizes = np.diff(offsets)
+    result = {
+        'pixels': sizes,
+        'valid_pixels': np.zeros(count, dtype=np.int64),
+        'min': np.full(count, np.nan),
+        'mean': np.full(count, np.nan),
+        'max': np.full(count, np.nan),
+        'area_km2': np.zeros(count),
+    }
+    if threshold is not None:
+        result['area_over_threshold_km2'] = np.zeros(count)
+
+    nonempty = np.flatnonzero(sizes)
+    if nonempty.size == 0:
+        return result
+    # Empty polygons own no pixels, so segments of the others stay contiguous
+    starts = offsets[:-1][nonempty]
+
+    v = values.ravel()[pixels]
+    valid = ~np.isnan(v)
+    area = grid.row_area_km2[pixels // grid.width]
+
+    valid_count = np.add.reduceat(valid, starts)
+    total = np.add.reduceat(np.where(valid, v, 0.0), starts)
+    result['valid_pixels'][nonempty] = valid_count
+    result['min'][nonempty] = np.fmin.reduceat(v, starts)
+    result['max'][nonempty] = np.fmax.reduceat(v, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result['mean'][nonempty] = np.where(valid_count > 0, total / valid_count, np.nan)
+    result['area_km2'][nonempty] = np.add.reduceat(area, starts)
+    if threshold is not None:
+        result['area_over_threshold_km2'][nonempty] = np.add.reduceat(np.where(v >= threshold, area, 0.0), starts)
+    return result